@@ -0,0 +1,429 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# 效能量測腳本：只用標準函式庫，量測 render_ner_html_with_label_v5 的各項 Python 元件
+# 用法：python bench_ner.py <子命令> [參數]
+import argparse, gc, json, os, random, shutil, subprocess, sys, tempfile, time, tracemalloc
+
+import render_ner_html_with_label_v5 as ner
+
+# ===== 合成語料 =====
+FILLER = "的了有及在為與並於後前無其他左右上下大小多少"
+ASCII_BITS = [" ", "，", "。", "Metformin", "5mg", "(HTN)"]
+
+def synth_sentence(rng: random.Random, words: int = 12) -> str:
+    # 以詞典詞、單字與英數片段隨機拼出一句，模擬 WORD_SECTIONS 內容
+    parts = []
+    for _ in range(words):
+        r = rng.random()
+        if r < 0.6:
+            parts.append(rng.choice(ner.MED_DICT))
+        elif r < 0.8:
+            parts.append(rng.choice(FILLER))
+        else:
+            parts.append(rng.choice(ASCII_BITS))
+    return "".join(parts)
+
+# ===== 子命令 =====
+def bench_segment(args):
+    # 中文斷詞吞吐量（chars/sec）：重複切同一批句子至少 args.seconds 秒
+    rng = random.Random(args.seed)
+    sents = [synth_sentence(rng) for _ in range(args.sentences)]
+    chars = sum(len(s) for s in sents)
+    words = list(ner.MED_DICT)
+    if args.user_dict:
+        words += ner.load_user_dict(args.user_dict)
+    t0 = time.perf_counter()
+    seg = ner.Segmenter(words)
+    build = time.perf_counter() - t0
+    reps, t0 = 0, time.perf_counter()
+    while True:
+        for s in sents:
+            seg.tokenize(s)
+        reps += 1
+        elapsed = time.perf_counter() - t0
+        if elapsed >= args.seconds:
+            break
+    print(f"dict words     : {len(set(words))}")
+    print(f"trie nodes     : {len(seg.fwd.term)}")
+    print(f"build time     : {build * 1000:.2f} ms")
+    print(f"corpus chars   : {chars}")
+    print(f"throughput     : {chars * reps / elapsed:,.0f} chars/sec")
+
+def synth_segments(rng: random.Random, n: int) -> list:
+    # 合成 segments.jsonl 列：一半 WORD_SECTIONS（中文），一半逗號分隔的英文診斷/主訴
+    secs = ["過去病史", "住院治療經過", "診斷", "主訴"]
+    eng = ["Type 2 diabetes mellitus", "hypertension", "CKD stage 3", "s/p PCI (2019, LAD)",
+           "chest pain", "dizziness for 3 days", "Metformin 500mg bid", "aspirin and warfarin"]
+    out = []
+    for i in range(n):
+        sec = secs[i % len(secs)]
+        if sec in ner.WORD_SECTIONS:
+            text = synth_sentence(rng, 16)
+        else:
+            text = ", ".join(rng.choice(eng) for _ in range(rng.randint(3, 8)))
+        out.append({"file": f"note{i // 40}.txt", "section": sec, "start": 0, "end": len(text), "text": text})
+    return out
+
+def measure(build):
+    # 回傳 (結果, 建立後仍保留的 bytes, 建立過程峰值 bytes)
+    gc.collect()
+    tracemalloc.start()
+    obj = build()
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return obj, current, peak
+
+def bench_tokens(args):
+    # dict-per-token（鏡像前端 tokenizeSentence 的 record）vs TokenStore 的 tracemalloc 比較
+    rng = random.Random(args.seed)
+    segs = synth_segments(rng, args.sentences)
+    seg = ner.Segmenter(ner.MED_DICT)
+
+    def build_dicts():
+        rows, buckets = [], {}
+        for s in segs:
+            buckets.setdefault((s["file"], s["section"]), []).append(s["text"])
+        for (file, section), texts in buckets.items():
+            for i, text in enumerate(texts):
+                for k, (t, a, b) in enumerate(ner.tokenize_sentence(section, text, seg)):
+                    rows.append({"id": f"{file}:{section}:{i}:{k}",
+                                 "meta": {"file": file, "section": section, "source_span": [None, None],
+                                          "sentence_index": i, "token_index": k},
+                                 "text": t, "start": a, "end": b, "label": "O"})
+        return rows
+
+    rows, d_cur, d_peak = measure(build_dicts)
+    n = len(rows)
+    del rows
+    store, s_cur, s_peak = measure(lambda: ner.TokenStore.from_segments(segs, seg))
+    print(f"sentences      : {len(segs)}")
+    print(f"tokens         : {n}")
+    print(f"{'layout':<14} {'retained':>12} {'peak':>12} {'bytes/token':>12}")
+    for name, cur, peak in (("dict-per-token", d_cur, d_peak), ("TokenStore", s_cur, s_peak)):
+        print(f"{name:<14} {cur / 2**20:>9.1f} MB {peak / 2**20:>9.1f} MB {cur / max(1, n):>12.1f}")
+    print(f"retained ratio : {d_cur / max(1, s_cur):.1f}x")
+
+def synth_note(rng: random.Random) -> str:
+    # 合成一份含四個常見章節的病歷原文
+    dx = " ".join("#" + rng.choice(["Type 2 diabetes mellitus", "Hypertension", "CKD stage 3", "CAD s/p PCI"])
+                  for _ in range(rng.randint(2, 4)))
+    cc = ", ".join(rng.choice(["chest pain", "dizziness for 3 days", "fever", "cough"]) for _ in range(3)) + "."
+    ph = "，".join(synth_sentence(rng, 10) for _ in range(3)) + "。"
+    hc = "。".join(synth_sentence(rng, 14) for _ in range(4)) + "。"
+    return f"診斷: {dx}\n主訴: {cc}\n過去病史: {ph}\n住院治療經過: {hc}\n"
+
+# 在 Node 中載入頁面 SCRIPT：以最小 DOM stub 取代瀏覽器；argv[2] 為頁面 JS
+# 環境變數 INIT_FILE / INIT_ENC 提供 #__INIT__ 的內容與 data-encoding
+NODE_PAGE_STUB = r"""
+const fs = require('fs');
+function el(){
+  // 任何屬性都回傳另一個可呼叫的 stub 元素；只有少數屬性需要具體值
+  const t = Object.assign(function(){ return el(); }, {dataset:{}, style:{}, classList:{add(){},remove(){},contains(){ return false; }}});
+  return new Proxy(t, {get(t,k){
+    if (k in t || typeof k === 'symbol') return t[k];
+    if (k === 'querySelectorAll') return () => [];
+    if (k === 'parentElement') return null;
+    if (k === 'textContent' || k === 'innerHTML' || k === 'value') return '';
+    return el();
+  }});
+}
+const INIT_EL = {textContent: process.env.INIT_FILE ? fs.readFileSync(process.env.INIT_FILE, 'utf8') : '',
+                 dataset: {encoding: process.env.INIT_ENC}};
+global.document = {querySelector: el, querySelectorAll: () => [], createElement: el, head: el(),
+                   getElementById: id => id === '__INIT__' ? INIT_EL : el()};
+(0, eval)(fs.readFileSync(process.argv[2], 'utf8') + `
+;global.__P = {preprocessRawToData, readInitPayload, tokCount, tokText, tokLabel,
+               setFileData, wsSaveFile, wsLoadFile, get WS(){ return WS; },
+               setWords: w => { SEG_WORDS = new Set(w); buildSegmenter(); }};`);
+const P = global.__P;
+"""
+
+def run_page_in_node(page_js: str, harness: str, args=(), env=None, node_flags=(), prelude: str = "") -> dict:
+    # 將頁面 JS 與 harness 寫到暫存檔後以 node 執行，回傳 harness 最後一行輸出的 JSON
+    # prelude 在載入頁面之前執行（例如補上瀏覽器 API）
+    node = shutil.which("node")
+    if not node:
+        raise SystemExit("此量測需要 node（用來執行頁面 SCRIPT）")
+    with tempfile.TemporaryDirectory() as tmp:
+        page_path, harness_path = os.path.join(tmp, "page.js"), os.path.join(tmp, "harness.js")
+        with open(page_path, "w", encoding="utf-8") as f:
+            f.write(page_js)
+        with open(harness_path, "w", encoding="utf-8") as f:
+            f.write(prelude + NODE_PAGE_STUB + harness)
+        out = subprocess.run([node, *node_flags, harness_path, page_path, *args], capture_output=True, text=True,
+                             check=True, env={**os.environ, **(env or {})})
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+def page_script(doc: str) -> str:
+    # 取出 HTML 中最後一個 <script> 的內容（頁面主程式）
+    return doc.rsplit("<script>", 1)[1].rsplit("</script>", 1)[0]
+
+# 比較兩種 token 版面的 heap；argv[3] 為 {notes, dict} 設定檔
+PAGE_HEAP_HARNESS = r"""
+const cfg = JSON.parse(fs.readFileSync(process.argv[3], 'utf8'));
+P.setWords(cfg.dict);
+const heap = () => { global.gc(); global.gc(); return process.memoryUsage().heapUsed; };
+function legacy(files){
+  // 舊版：DATA 每 token 一個物件（含 meta），另有 tokenRows 與 labeledRows 兩份完整副本
+  const data = {}, tokenRows = [], labeledRows = [];
+  Object.entries(files).forEach(([file, secs]) => Object.entries(secs).forEach(([sec, sents]) => Object.entries(sents).forEach(([sidx, s]) => {
+    const rows = [];
+    for (let i = 0; i < P.tokCount(s); i++){
+      const meta = {file, section: sec, source_span: [null, null], sentence_index: +sidx, token_index: i};
+      const text = P.tokText(s, i).slice(0), id = `${file}:${sec}:${sidx}:${i}`;
+      rows.push({text, start: s.start[i], end: s.end[i], label: 'O', meta});
+      tokenRows.push({id, meta: {...meta}, text, start: s.start[i], end: s.end[i], label: 'O'});
+      labeledRows.push({id, meta: {...meta}, text, start: s.start[i], end: s.end[i], label: 'O'});
+    }
+    ((data[file] = data[file] || {})[sec] = data[file][sec] || {})[sidx] = rows;
+  })));
+  return {data, tokenRows, labeledRows};
+}
+const notes = cfg.notes;
+let tokens = 0;
+const base = heap();
+let DATA_NEW = {};
+notes.forEach((raw, n) => { const name = 'note' + n; DATA_NEW[name] = P.preprocessRawToData(raw, name).files[name]; });
+const typed = heap() - base;
+Object.values(DATA_NEW).forEach(secs => Object.values(secs).forEach(m => Object.values(m).forEach(s => tokens += P.tokCount(s))));
+const base2 = heap();
+const LEG = legacy(DATA_NEW);
+const leg = heap() - base2;
+console.log(JSON.stringify({notes: notes.length, tokens, typed, legacy: leg, keep: [!!DATA_NEW, !!LEG]}));
+"""
+
+def bench_page_heap(args):
+    # 需要 node（--expose-gc）；量測 heapUsed 差值，近似 DevTools heap snapshot 的保留大小
+    rng = random.Random(args.seed)
+    notes = [synth_note(rng) for _ in range(args.notes)]
+    with tempfile.TemporaryDirectory() as tmp:
+        cfg = os.path.join(tmp, "cfg.json")
+        with open(cfg, "w", encoding="utf-8") as f:
+            json.dump({"notes": notes, "dict": ner.MED_DICT}, f, ensure_ascii=False)
+        r = run_page_in_node(page_script(ner.HTML_SCRIPT), PAGE_HEAP_HARNESS, [cfg],
+                             node_flags=["--expose-gc", "--max-old-space-size=8192"])
+    n = max(1, r["tokens"])
+    print(f"notes          : {r['notes']}")
+    print(f"tokens         : {r['tokens']}")
+    print(f"{'layout':<22} {'heap':>10} {'bytes/token':>12}")
+    print(f"{'object-per-token (old)':<22} {r['legacy'] / 2**20:>7.1f} MB {r['legacy'] / n:>12.1f}")
+    print(f"{'typed-array Sentence':<22} {r['typed'] / 2**20:>7.1f} MB {r['typed'] / n:>12.1f}")
+    print(f"ratio          : {r['legacy'] / max(1, r['typed']):.1f}x")
+
+# 子行程：產生報告後回報自身峰值 RSS（KB），每次量測都用全新行程
+RENDER_CHILD = r"""
+import json, resource, sys
+import render_ner_html_with_label_v5 as ner
+mode, src, out = sys.argv[1:4]
+labels = sorted({str(r.get("label") or "O") for r in ner.iter_jsonl(src)} | {"O"})
+files = ner.iter_labeled_files(ner.iter_jsonl(src))
+if mode == "stream":
+    ner.render_html(files, labels, out, "bench", "bench")
+else:
+    # 舊做法：整份 dict → 單次 json.dumps → html_out 串接後一次寫出
+    init_json = json.dumps({"files": dict(files), "labels": labels, "dict": ner.MED_DICT}, ensure_ascii=False)
+    html_out = [ner.HTML_HEAD.format(title="bench", subtitle="bench", css_rules=""), ner.HTML_INPUT,
+                ner.HTML_INIT_JSON.format(init_json=init_json), ner.HTML_SCRIPT, ner.HTML_TAIL]
+    with open(out, "w", encoding="utf-8") as f:
+        f.write("".join(html_out))
+print(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss)
+"""
+
+# 重複呼叫頁面的 readInitPayload（解碼 + JSON.parse），輸出中位數毫秒；argv[3] 為次數
+DECODE_HARNESS = r"""
+const reps = +process.argv[3], times = [];
+(function run(){
+  const t0 = performance.now();
+  P.readInitPayload(init => {
+    times.push(performance.now() - t0);
+    if (times.length < reps) return run();
+    times.sort((a, b) => a - b);
+    console.log(JSON.stringify({ms: times[times.length >> 1], files: Object.keys(init.files || {}).length}));
+  });
+})();
+"""
+
+def bench_compress(args):
+    # --compress 前後：輸出大小與頁面端解碼時間（需 node 20+，內建 DecompressionStream）
+    here = os.path.dirname(os.path.abspath(__file__))
+    with tempfile.TemporaryDirectory() as tmp:
+        src = os.path.join(tmp, "labeled.jsonl")
+        subprocess.run([sys.executable, os.path.join(here, "bench_ner.py"), "gen-labeled", "--sentences",
+                        str(args.sentences), "--seed", str(args.seed), "--out", src], check=True)
+        labels = sorted({str(r.get("label") or "O") for r in ner.iter_jsonl(src)} | {"O"})
+        print(f"input          : {args.sentences} sentences, {os.path.getsize(src) / 2**20:.1f} MB jsonl")
+        print(f"{'mode':<10} {'html':>10} {'script':>10} {'__INIT__':>10} {'decode':>10}")
+        for compress in (False, True):
+            out = os.path.join(tmp, "out.html")
+            ner.render_html(ner.iter_labeled_files(ner.iter_jsonl(src)), labels, out, "bench", "bench",
+                            compress=compress)
+            with open(out, encoding="utf-8") as f:
+                doc = f.read()
+            init_text = doc.split('id="__INIT__"', 1)[1].split(">", 1)[1].split("</script>", 1)[0]
+            init_file = os.path.join(tmp, "init.txt")
+            with open(init_file, "w", encoding="utf-8") as f:
+                f.write(init_text)
+            r = run_page_in_node(page_script(doc), DECODE_HARNESS, [str(args.reps)],
+                                 env={"INIT_FILE": init_file, "INIT_ENC": "gzip+base64" if compress else ""})
+            size = lambda t: len(t.encode("utf-8")) / 1024
+            print(f"{'compress' if compress else 'plain':<10} {size(doc):>7.1f} KB {size(page_script(doc)):>7.1f} KB "
+                  f"{size(init_text):>7.1f} KB {r['ms']:>7.1f} ms")
+
+# 以記憶體中的 Map 模擬 IndexedDB（值以 structuredClone 存取，callback 非同步觸發）；
+# 整個資料庫以 v8.serialize 存到 IDB_FILE，模擬關閉分頁後重新開啟
+FAKE_IDB = r"""
+const v8 = require('v8');
+const IDB = require('fs').existsSync(process.env.IDB_FILE) ? v8.deserialize(require('fs').readFileSync(process.env.IDB_FILE)) : {};
+function idbReq(fn){
+  const r = {};
+  setImmediate(() => { r.result = fn(); if (r.onsuccess) r.onsuccess({target: r}); });
+  return r;
+}
+global.location = {pathname: '/bench/report.html'};
+global.indexedDB = {open(name){
+  const r = {};
+  setImmediate(() => {
+    const fresh = !IDB[name], db = IDB[name] = IDB[name] || {};
+    r.result = {
+      createObjectStore(n, o){ db[n] = {key: o.keyPath, rows: new Map()}; },
+      transaction(){
+        const tx = {objectStore: n => ({
+          put: v => idbReq(() => { db[n].rows.set(v[db[n].key], structuredClone(v)); }),
+          get: k => idbReq(() => db[n].rows.has(k) ? structuredClone(db[n].rows.get(k)) : undefined),
+          getAll: () => idbReq(() => [...db[n].rows.values()].map(v => structuredClone(v))),
+          clear: () => idbReq(() => db[n].rows.clear())})};
+        setImmediate(() => setImmediate(() => tx.oncomplete && tx.oncomplete()));
+        return tx;
+      }};
+    if (fresh && r.onupgradeneeded) r.onupgradeneeded();
+    r.onsuccess();
+  });
+  return r;
+}};
+global.__saveIDB = () => require('fs').writeFileSync(process.env.IDB_FILE, v8.serialize(IDB));
+global.gc(); global.__H0 = process.memoryUsage().heapUsed; global.__T0 = performance.now();
+"""
+
+# build：斷詞後逐檔寫入工作區；open：重新開啟頁面（只讀 meta），再逐檔載入全部 token 比較 heap
+WORKSPACE_HARNESS = r"""
+const cfg = JSON.parse(fs.readFileSync(process.argv[3], 'utf8'));
+const until = (cond, cb) => cond() ? cb() : setTimeout(() => until(cond, cb), 1);
+const heap = () => { global.gc(); return process.memoryUsage().heapUsed - global.__H0; };
+if (process.argv[4] === 'build'){
+  P.setWords(cfg.dict);
+  until(() => P.WS.db, () => {
+    cfg.notes.forEach((note, i) => {
+      const name = `note${i}.txt`, r = P.preprocessRawToData(note, name);
+      P.setFileData(name, r.files[name]);
+      P.wsSaveFile(name, r.segments);
+    });
+    setTimeout(() => { global.__saveIDB(); console.log(JSON.stringify({files: cfg.notes.length})); }, 50);
+  });
+} else {
+  until(() => P.WS.meta.size === cfg.notes.length, () => {
+    const openMs = performance.now() - global.__T0, metaHeap = heap();
+    const names = [...P.WS.meta.keys()], times = [];
+    (function next(i){
+      if (i === names.length){
+        times.sort((a, b) => a - b);
+        console.log(JSON.stringify({open_ms: openMs, meta_heap: metaHeap, full_heap: heap(),
+                                    load_ms: times[times.length >> 1]}));
+        return;
+      }
+      const t0 = performance.now();
+      P.wsLoadFile(names[i], () => { times.push(performance.now() - t0); next(i + 1); });
+    })(0);
+  });
+}
+"""
+
+def bench_workspace(args):
+    # 工作區重新開啟：只讀 meta 的耗時與 heap，對照把所有檔案 token 載回記憶體
+    rng = random.Random(args.seed)
+    notes = [synth_note(rng) for _ in range(args.notes)]
+    page = page_script(ner.HTML_SCRIPT)
+    with tempfile.TemporaryDirectory() as tmp:
+        cfg = os.path.join(tmp, "cfg.json")
+        with open(cfg, "w", encoding="utf-8") as f:
+            json.dump({"notes": notes, "dict": ner.MED_DICT}, f, ensure_ascii=False)
+        env = {"IDB_FILE": os.path.join(tmp, "idb.bin")}
+        flags = ["--expose-gc", "--max-old-space-size=8192"]
+        run_page_in_node(page, WORKSPACE_HARNESS, [cfg, "build"], env=env, node_flags=flags, prelude=FAKE_IDB)
+        r = run_page_in_node(page, WORKSPACE_HARNESS, [cfg, "open"], env=env, node_flags=flags, prelude=FAKE_IDB)
+    mb = lambda b: f"{b / 2**20:.1f} MB"
+    print(f"notes          : {args.notes}")
+    print(f"reopen (meta)  : {r['open_ms']:.1f} ms, heap {mb(r['meta_heap'])}")
+    print(f"expand one file: {r['load_ms']:.2f} ms (median)")
+    print(f"all files      : heap {mb(r['full_heap'])}")
+
+def gen_labeled(args):
+    # 產生合成 ner_labeled.jsonl（含少量實體標籤），供其他量測當輸入
+    store = ner.TokenStore.from_segments(synth_segments(random.Random(args.seed), args.sentences),
+                                         ner.Segmenter(ner.MED_DICT))
+    for sid in range(len(store.sent_text)):
+        store.set_labels(sid, ["B-Disease" if store.row(i).text.startswith(("高血壓", "糖尿病", "hypertension"))
+                               else "O" for i in store.sentence_tokens(sid)])
+    store.write_jsonl(args.out)
+
+def bench_render(args):
+    # render_html 峰值 RSS 對輸入大小：串流寫出 vs 舊的單次 json.dumps
+    # 輸入也由子行程產生：ru_maxrss 會算入 fork 當下複製的父行程記憶體
+    here = os.path.dirname(os.path.abspath(__file__))
+    print(f"{'sentences':>10} {'input MB':>9} {'html MB':>8} {'oneshot RSS':>12} {'stream RSS':>11}")
+    with tempfile.TemporaryDirectory() as tmp:
+        for n in args.sizes:
+            src, out = os.path.join(tmp, "labeled.jsonl"), os.path.join(tmp, "out.html")
+            subprocess.run([sys.executable, os.path.abspath(__file__), "gen-labeled", "--sentences", str(n),
+                            "--seed", str(args.seed), "--out", src], check=True)
+            rss = {}
+            for mode in ("oneshot", "stream"):
+                r = subprocess.run([sys.executable, "-c", RENDER_CHILD, mode, src, out], cwd=here,
+                                   capture_output=True, text=True, check=True)
+                rss[mode] = int(r.stdout.strip().splitlines()[-1]) / 1024
+            print(f"{n:>10} {os.path.getsize(src) / 2**20:>9.1f} {os.path.getsize(out) / 2**20:>8.1f} "
+                  f"{rss['oneshot']:>9.1f} MB {rss['stream']:>8.1f} MB")
+
+def build_argparser():
+    ap = argparse.ArgumentParser(description="render_ner_html_with_label_v5 效能量測")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    sp = sub.add_parser("segment", help="中文斷詞吞吐量")
+    sp.add_argument("--sentences", type=int, default=2000)
+    sp.add_argument("--seconds", type=float, default=2.0)
+    sp.add_argument("--seed", type=int, default=0)
+    sp.add_argument("--user-dict", metavar="TXT")
+    sp.set_defaults(func=bench_segment)
+    sp = sub.add_parser("tokens", help="dict-per-token 與 TokenStore 記憶體比較（tracemalloc）")
+    sp.add_argument("--sentences", type=int, default=50000)
+    sp.add_argument("--seed", type=int, default=0)
+    sp.set_defaults(func=bench_tokens)
+    sp = sub.add_parser("page-heap", help="頁面 DATA：每 token 物件 vs typed-array Sentence 的 heap（需 node）")
+    sp.add_argument("--notes", type=int, default=500)
+    sp.add_argument("--seed", type=int, default=0)
+    sp.set_defaults(func=bench_page_heap)
+    sp = sub.add_parser("gen-labeled", help="產生合成 ner_labeled.jsonl")
+    sp.add_argument("--sentences", type=int, default=10000)
+    sp.add_argument("--seed", type=int, default=0)
+    sp.add_argument("--out", default="ner_labeled.synth.jsonl")
+    sp.set_defaults(func=gen_labeled)
+    sp = sub.add_parser("compress", help="--compress 前後的輸出大小與解碼時間（需 node）")
+    sp.add_argument("--sentences", type=int, default=20000)
+    sp.add_argument("--reps", type=int, default=5)
+    sp.add_argument("--seed", type=int, default=0)
+    sp.set_defaults(func=bench_compress)
+    sp = sub.add_parser("workspace", help="IndexedDB 工作區：重新開啟（只讀 meta）vs 全部載入（需 node）")
+    sp.add_argument("--notes", type=int, default=1000)
+    sp.add_argument("--seed", type=int, default=0)
+    sp.set_defaults(func=bench_workspace)
+    sp = sub.add_parser("render", help="render_html 峰值 RSS：串流 vs 單次 json.dumps")
+    sp.add_argument("--sizes", type=lambda v: [int(x) for x in v.split(",")], default=[10000, 40000, 160000],
+                    help="句數，逗號分隔")
+    sp.add_argument("--seed", type=int, default=0)
+    sp.set_defaults(func=bench_render)
+    return ap
+
+def main():
+    args = build_argparser().parse_args()
+    args.func(args)
+
+if __name__ == "__main__":
+    main()
@@ -1,7 +1,10 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
-import argparse, json, html, re
-from typing import Dict, List
+import argparse, base64, cProfile, json, html, os, pstats, re, sys, time, tracemalloc, zlib
+from array import array
+from collections import Counter
+from contextlib import contextmanager, nullcontext
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple, Union
 
 # ===== 後端：HTML 產出的小工具 =====
 def esc(s: str) -> str:
@@ -31,6 +34,372 @@ def build_palette(labels: List[str]):
     css["O"] = ("transparent", "rgba(0,0,0,.18)")
     return css
 
+# ===== 中文斷詞（字典最大匹配） =====
+# 內建臨床詞典：WORD_SECTIONS 的中文連續字串以此切分；可用 --user-dict 追加
+MED_DICT = [
+    "高血壓", "糖尿病", "高血脂", "高脂血症", "冠狀動脈", "冠狀動脈疾病", "心肌梗塞", "心衰竭", "心房顫動",
+    "心律不整", "腦中風", "中風", "腦梗塞", "腦出血", "慢性腎臟病", "腎衰竭", "急性腎損傷", "肝硬化", "肝炎",
+    "肺炎", "慢性阻塞性肺病", "氣喘", "肺結核", "敗血症", "尿路感染", "泌尿道感染", "蜂窩性組織炎",
+    "胃潰瘍", "消化性潰瘍", "胃食道逆流", "腸胃道出血", "貧血", "甲狀腺", "甲狀腺機能亢進",
+    "甲狀腺機能低下", "痛風", "骨質疏鬆", "骨折", "癌症", "肺癌", "肝癌", "乳癌", "大腸癌", "胃癌",
+    "攝護腺肥大", "失智症", "帕金森氏症", "癲癇", "憂鬱症",
+    "發燒", "咳嗽", "胸痛", "胸悶", "腹痛", "頭痛", "頭暈", "呼吸困難", "噁心", "嘔吐", "腹瀉", "便秘",
+    "水腫", "意識不清", "昏迷", "疲倦", "心悸", "血尿", "黃疸",
+    "住院", "入院", "出院", "轉院", "急診", "加護病房", "門診", "追蹤", "治療", "手術", "開刀", "化療",
+    "放射治療", "洗腎", "血液透析", "插管", "氧氣", "輸血", "抗生素", "胰島素", "類固醇", "止痛藥",
+    "降血壓藥", "降血糖藥", "抗凝血劑", "利尿劑", "點滴", "靜脈注射", "口服", "服用", "使用", "給予",
+    "接受", "安排", "檢查", "心電圖", "電腦斷層", "核磁共振", "超音波", "抽血", "血糖", "血壓", "心跳",
+    "體溫", "血氧", "白血球", "血紅素", "血小板", "肌酸酐",
+    "病史", "過去病史", "家族病史", "多年", "病人", "患者", "主訴", "診斷", "目前", "持續", "穩定",
+    "改善", "惡化", "控制", "不良", "良好", "規則", "不規則", "慢性", "急性", "左側", "右側", "雙側",
+]
+CJK_RUN = re.compile(r"[\u3400-\u9fff\uf900-\ufaff]+")
+
+def load_user_dict(path: str) -> List[str]:
+    # 一行一詞；相容 jieba 格式「詞 頻率 詞性」，只取第一欄；# 開頭為註解
+    words = []
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if line and not line.startswith("#"):
+                words.append(line.split()[0])
+    return words
+
+class PackedTrie:
+    # 壓縮 trie：以 BFS 編號，節點 n 的子節點為連續區間 [first[n], first[n+1])
+    # chars[c] 為進入節點 c 的字元（區間內已排序，可二分搜尋），term[c]=1 表示根到 c 為完整詞
+    # 與前端 buildPackedTrie 相同結構
+    def __init__(self, words: Iterable[str]):
+        ws = sorted(set(w for w in words if w))
+        chars, first, term = array("I", [0]), array("i"), array("B", [0])
+        queue = [(0, len(ws), 0)]
+        n = 0
+        while n < len(queue):
+            lo, hi, d = queue[n]
+            first.append(len(queue))
+            i = lo
+            while i < hi and len(ws[i]) == d:  # 與前綴等長的詞就是此節點本身
+                i += 1
+            while i < hi:
+                c = ws[i][d]
+                j = i
+                while j < hi and ws[j][d] == c:
+                    j += 1
+                chars.append(ord(c))
+                term.append(1 if len(ws[i]) == d + 1 else 0)
+                queue.append((i, j, d + 1))
+                i = j
+            n += 1
+        first.append(len(queue))
+        self.chars, self.first, self.term = chars, first, term
+
+    def longest(self, text: str, i: int, step: int = 1) -> int:
+        # 自 text[i] 起往 step 方向（+1 / -1）走，回傳最長完整詞長度（0 = 無）
+        chars, first, term = self.chars, self.first, self.term
+        n, best, k, L = 0, 0, i, 0
+        while 0 <= k < len(text):
+            c = ord(text[k])
+            lo, hi = first[n], first[n + 1]
+            end = hi
+            while lo < hi:
+                mid = (lo + hi) >> 1
+                if chars[mid] < c:
+                    lo = mid + 1
+                else:
+                    hi = mid
+            if lo == end or chars[lo] != c:
+                break
+            n = lo
+            L += 1
+            if term[n]:
+                best = L
+            k += step
+        return best
+
+class Segmenter:
+    # 雙向最大匹配：正向（FMM）與逆向（BMM）各切一次，
+    # 取詞數較少者；同詞數取單字較少者；再相同取逆向結果
+    def __init__(self, words: Iterable[str]):
+        words = list(words)
+        self.fwd = PackedTrie(words)
+        self.bwd = PackedTrie(w[::-1] for w in words)
+
+    def segment_cjk(self, run: str) -> List[str]:
+        n = len(run)
+        fmm, i = [], 0
+        while i < n:
+            L = self.fwd.longest(run, i, 1) or 1
+            fmm.append(run[i:i + L])
+            i += L
+        bmm, j = [], n
+        while j > 0:
+            L = self.bwd.longest(run, j - 1, -1) or 1
+            bmm.append(run[j - L:j])
+            j -= L
+        bmm.reverse()
+        if len(fmm) != len(bmm):
+            return fmm if len(fmm) < len(bmm) else bmm
+        singles = lambda seq: sum(1 for w in seq if len(w) == 1)
+        return fmm if singles(fmm) < singles(bmm) else bmm
+
+    def split_chunk(self, chunk: str) -> List[str]:
+        # 中文連續字串交給 segment_cjk；其餘（英數、標點）整段保留
+        out, last = [], 0
+        for m in CJK_RUN.finditer(chunk):
+            if m.start() > last:
+                out.append(chunk[last:m.start()])
+            out.extend(self.segment_cjk(m.group()))
+            last = m.end()
+        if last < len(chunk):
+            out.append(chunk[last:])
+        return out
+
+    def tokenize(self, text: str) -> List[str]:
+        # 與前端 segmentWords 相同：先以空白切塊（尾隨空白黏在塊末），塊內再切中文
+        # 所有 token 直接相連即為原句
+        toks, i, n = [], 0, len(text)
+        while i < n:
+            j = text.find(" ", i)
+            if j < 0:
+                j = n
+            k = j
+            while k < n and text[k] == " ":
+                k += 1
+            pieces = self.split_chunk(text[i:j])
+            if pieces:
+                pieces[-1] += text[j:k]
+            elif k > j:
+                pieces = [text[j:k]]
+            toks.extend(pieces)
+            i = k
+        return toks
+
+# ===== 分詞（與前端 tokenizeSentence 相同） =====
+WORD_SECTIONS = {"過去病史", "Past_History", "Past History", "住院治療經過", "Hospital_Course", "Hospital Course"}
+
+def split_outside_parens(text: str) -> List[str]:
+    # 以逗號/分號/ and 分割，但括號內不切（同前端 splitOutsideParens）
+    depth, cur, toks = 0, [], []
+    def flush():
+        t = "".join(cur).strip()
+        if t:
+            toks.append(t)
+        cur.clear()
+    i = 0
+    while i < len(text):
+        ch = text[i]
+        if ch == "(":
+            depth += 1
+        elif ch == ")":
+            depth = max(depth - 1, 0)
+        elif depth == 0:
+            if text[i:i + 5].lower() == " and ":
+                flush()
+                toks.append("and")
+                i += 5
+                continue
+            if ch in ",;":
+                flush()
+                i += 1
+                continue
+        cur.append(ch)
+        i += 1
+    flush()
+    return toks
+
+def compute_offsets(sentence: str, token: str, start_pos: int) -> Tuple[int, int]:
+    # 自 start_pos 起找 token；找不到時以壓縮空白後再比對，最後退回緊接 start_pos（同前端 computeOffsets）
+    idx = sentence.find(token, start_pos)
+    if idx >= 0:
+        return idx, idx + len(token)
+    nt = re.sub(r"\s+", " ", token)
+    j = re.sub(r"\s+", " ", sentence).find(nt)
+    if j >= 0:
+        return j, j + len(nt)
+    return start_pos, start_pos + len(token)
+
+def tokenize_sentence(section: str, text: str, seg: Segmenter) -> List[Tuple[str, int, int]]:
+    # 一句 → [(token 文字, start, end), ...]；WORD_SECTIONS 走 Segmenter，其餘走 split_outside_parens
+    toks = seg.tokenize(text) if section in WORD_SECTIONS else split_outside_parens(text)
+    out, cursor = [], 0
+    for t in toks:
+        s, e = compute_offsets(text, t, cursor)
+        out.append((t, s, e))
+        cursor = e
+    return out
+
+# ===== 欄位式 token 儲存（Python 批次處理用） =====
+class TokenStore:
+    # 取代「每個 token 一個 dict」：所有欄位存在 array 中，字串只存一次
+    #   token 欄：tok_start / tok_end / tok_sent（句子編號）/ tok_label（標籤碼，對應 labels 表）
+    #   句子欄：sent_text（原句只存一份）/ sent_file / sent_sec（字串表索引）/ sent_idx / sent_first（第一個 token）
+    # token 文字預設為原句切片；computeOffsets 走退路導致不一致時才記在 text_override
+    # 以 row(i) / iter_rows() 取得惰性列檢視，需要時才組成 ner_token_rows.jsonl 的 dict
+    def __init__(self):
+        self.files: List[str] = []
+        self.sections: List[str] = []
+        self.labels: List[str] = ["O"]
+        self._file_ids: Dict[str, int] = {}
+        self._sec_ids: Dict[str, int] = {}
+        self._label_ids: Dict[str, int] = {"O": 0}
+        self.sent_text: List[str] = []
+        self.sent_file, self.sent_sec = array("i"), array("i")
+        self.sent_idx, self.sent_first = array("i"), array("i")
+        self.tok_start, self.tok_end = array("i"), array("i")
+        self.tok_sent, self.tok_label = array("i"), array("H")
+        self.text_override: Dict[int, str] = {}
+
+    def __len__(self) -> int:
+        return len(self.tok_start)
+
+    @staticmethod
+    def _intern(table: List[str], ids: Dict[str, int], s: str) -> int:
+        i = ids.get(s)
+        if i is None:
+            i = ids[s] = len(table)
+            table.append(s)
+        return i
+
+    def label_id(self, label: str) -> int:
+        return self._intern(self.labels, self._label_ids, label)
+
+    def add_sentence(self, file: str, section: str, sidx: int, text: str,
+                     tokens: List[Tuple[str, int, int]]) -> int:
+        # 加入一句及其 token，回傳句子編號
+        sid = len(self.sent_text)
+        self.sent_text.append(text)
+        self.sent_file.append(self._intern(self.files, self._file_ids, file))
+        self.sent_sec.append(self._intern(self.sections, self._sec_ids, section))
+        self.sent_idx.append(sidx)
+        self.sent_first.append(len(self.tok_start))
+        for t, s, e in tokens:
+            if text[s:e] != t:
+                self.text_override[len(self.tok_start)] = t
+            self.tok_start.append(s)
+            self.tok_end.append(e)
+            self.tok_sent.append(sid)
+            self.tok_label.append(0)
+        return sid
+
+    def sentence_tokens(self, sid: int) -> range:
+        end = self.sent_first[sid + 1] if sid + 1 < len(self.sent_first) else len(self.tok_start)
+        return range(self.sent_first[sid], end)
+
+    def set_labels(self, sid: int, labels: List[str]) -> None:
+        for i, lab in zip(self.sentence_tokens(sid), labels):
+            self.tok_label[i] = self.label_id(lab)
+
+    def row(self, i: int) -> "TokenRow":
+        return TokenRow(self, i)
+
+    def iter_rows(self) -> Iterator["TokenRow"]:
+        for i in range(len(self)):
+            yield TokenRow(self, i)
+
+    def write_jsonl(self, path: str) -> None:
+        # 逐列序列化，不先組出完整 list
+        with open(path, "w", encoding="utf-8") as f:
+            for r in self.iter_rows():
+                f.write(json.dumps(r.to_dict(), ensure_ascii=False, separators=(",", ":")) + "\n")  # 與頁面 JSON.stringify 相同
+
+    @classmethod
+    def from_segments(cls, segments: Iterable[dict], seg: Segmenter) -> "TokenStore":
+        # segments.jsonl → TokenStore；與前端 preprocessRawToData 相同：
+        # 依 file+section 分桶（保留首次出現順序），桶內依序編 sentence_index
+        buckets: Dict[Tuple[str, str], List[str]] = {}
+        for s in segments:
+            buckets.setdefault((s["file"], s["section"]), []).append(s["text"])
+        store = cls()
+        for (file, section), texts in buckets.items():
+            for i, text in enumerate(texts):
+                store.add_sentence(file, section, i, text, tokenize_sentence(section, text, seg))
+        return store
+
+class TokenRow:
+    # TokenStore 中第 i 個 token 的惰性檢視；欄位於存取時才從 array 讀出
+    __slots__ = ("store", "i")
+
+    def __init__(self, store: TokenStore, i: int):
+        self.store, self.i = store, i
+
+    @property
+    def sentence(self) -> int:
+        return self.store.tok_sent[self.i]
+
+    @property
+    def token_index(self) -> int:
+        return self.i - self.store.sent_first[self.sentence]
+
+    @property
+    def start(self) -> int:
+        return self.store.tok_start[self.i]
+
+    @property
+    def end(self) -> int:
+        return self.store.tok_end[self.i]
+
+    @property
+    def text(self) -> str:
+        st = self.store
+        t = st.text_override.get(self.i)
+        return t if t is not None else st.sent_text[self.sentence][self.start:self.end]
+
+    @property
+    def label(self) -> str:
+        return self.store.labels[self.store.tok_label[self.i]]
+
+    def to_dict(self) -> dict:
+        # 與前端 tokenizeSentence / ner_labeled.jsonl 相同的欄位與順序
+        st, sid = self.store, self.sentence
+        file, section = st.files[st.sent_file[sid]], st.sections[st.sent_sec[sid]]
+        sidx, k = st.sent_idx[sid], self.token_index
+        return {
+            "id": f"{file}:{section}:{sidx}:{k}",
+            "meta": {"file": file, "section": section, "source_span": [None, None],
+                     "sentence_index": sidx, "token_index": k},
+            "text": self.text, "start": self.start, "end": self.end, "label": self.label,
+        }
+
+# ===== 標註統計（串流聚合 ner_labeled.jsonl） =====
+def iter_jsonl(path: str) -> Iterator[dict]:
+    # 逐行讀取 JSONL，不把整個檔案載入記憶體；空行略過
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if line:
+                yield json.loads(line)
+
+def summarize_labeled(rows: Iterable[dict]) -> Dict:
+    # 與前端 rebuildSummary 相同的片段規則：B-* 或實體改變即開新片段，連續 I-* 併入前一片段
+    # 單次走訪；只保留目前句子的鍵與上一個實體，記憶體與 token 數無關
+    by_ent, by_sec, by_file = Counter(), Counter(), Counter()
+    tokens = 0
+    cur_sent, cur_ent = None, None
+    for r in rows:
+        meta = r.get("meta") or {}
+        file, sec = meta.get("file"), meta.get("section")
+        key = (file, sec, meta.get("sentence_index"))
+        if key != cur_sent:
+            cur_sent, cur_ent = key, None
+        tokens += 1
+        lab = str(r.get("label") or "O")
+        if lab == "O":
+            cur_ent = None
+            continue
+        ent = re.sub(r"^[BI]-", "", lab)
+        if lab.startswith("B-") or cur_ent != ent:
+            by_ent[ent] += 1
+            by_sec[sec] += 1
+            by_file[file] += 1
+        cur_ent = ent
+    return {
+        "tokens": tokens,
+        "entities": sum(by_ent.values()),
+        "by_entity": dict(by_ent.most_common()),
+        "by_section": dict(by_sec.most_common()),
+        "by_file": dict(by_file.most_common()),
+    }
+
 # ===== HTML 模板骨架（拆段便於維護） =====
 HTML_HEAD = """<!doctype html>
 <html lang="zh-Hant">
@@ -89,6 +458,18 @@ HTML_HEAD = """<!doctype html>
   .toc{{margin:14px 0 18px 0;display:flex;flex-wrap:wrap;gap:10px}}
   .toc a{{text-decoration:none;color:var(--accent);font-size:13px;border:1px solid var(--line);padding:4px 8px;border-radius:8px;background:#fff}}
 
+  /* 搜尋 */
+  .search-results{{position:relative;height:260px;overflow:auto;margin-top:8px;border:1px solid var(--line);border-radius:8px}}
+  .search-row{{position:absolute;left:0;right:0;height:28px;line-height:28px;padding:0 8px;font-size:12px;cursor:pointer;white-space:nowrap;overflow:hidden;text-overflow:ellipsis;border-bottom:1px solid var(--line)}}
+  .search-row:hover{{background:var(--chip)}}
+  .search-row .where{{color:var(--muted);margin-left:6px}}
+  .tok.tok-hit{{outline:2px solid var(--accent);outline-offset:1px}}
+
+  /* 統計 */
+  table.stats{{width:100%;border-collapse:collapse;font-size:12px;margin:4px 0 10px 0}}
+  table.stats td{{padding:2px 4px;border-bottom:1px solid var(--line)}}
+  table.stats td:last-child{{text-align:right;font-variant-numeric:tabular-nums}}
+
   /* 動態 BIO 樣式（由 Python 產） */
   {css_rules}
 </style>
@@ -112,12 +493,15 @@ HTML_INPUT = """
             <span class="chip">工作表名稱 <input id="inFileName" class="search" style="width:180px" value="pasted.txt"/></span>
             <span class="chip">HF 模型 <input id="inModel" class="search" style="width:240px" value="d4data/biomedical-ner-all"/></span>
             <span class="chip">HF Token <input id="inToken" class="search" style="width:260px" placeholder="hf_xxx"/></span>
+            <span class="chip">使用者詞典 <input id="inDict" type="file" accept=".txt,.dict" style="width:200px"/></span>
           </div>
           <textarea id="inText" class="ta" placeholder="在此貼上整段病歷文字…"></textarea>
           <div class="panel" style="margin-top:10px">
             <span class="chip btn" id="btnPreprocess">① 只斷段 + 分詞</span>
             <span class="chip btn" id="btnRunNER">② 斷段 + 分詞 + NER</span>
+            <span class="chip btn" id="btnStopNER" style="display:none">■ 停止 NER</span>
             <span class="chip btn" id="btnClear">清除貼上結果</span>
+            <span class="chip btn" id="btnClearWS">清除工作區</span>
             <span class="chip">下載：
               <button type="button" id="dlSegments" class="btn" disabled style="margin-left:4px">segments.jsonl</button>
               <button type="button" id="dlTokens" class="btn" disabled>ner_token_rows.jsonl</button>
@@ -131,6 +515,15 @@ HTML_INPUT = """
     </div>
 
     <aside class="aside">
+      <div class="aside-card">
+        <div class="aside-head">搜尋</div>
+        <div class="aside-body">
+          <input id="searchBox" class="search" style="width:100%;box-sizing:border-box" placeholder="字首或 @實體，如 metf @Medication"/>
+          <div id="searchInfo" class="intro" style="margin:6px 0 0 0;font-size:12px"></div>
+          <div id="searchResults" class="search-results"><div class="search-spacer"></div></div>
+        </div>
+      </div>
+
       <div class="aside-card">
         <div class="aside-head">標籤
           <span>
@@ -145,6 +538,11 @@ HTML_INPUT = """
         <div class="aside-head">標註摘要</div>
         <div class="aside-body" id="annSummary"></div>
       </div>
+
+      <div class="aside-card">
+        <div class="aside-head">統計</div>
+        <div class="aside-body" id="annStats"></div>
+      </div>
     </aside>
   </div>
 """
@@ -153,6 +551,11 @@ HTML_INIT_JSON = """
 <script id="__INIT__" type="application/json">{init_json}</script>
 """
 
+# --compress：內容為 gzip 後再 base64 的 JSON，前端以 DecompressionStream 解開
+HTML_INIT_GZIP = """
+<script id="__INIT__" type="application/octet-stream" data-encoding="gzip+base64">{init_json}</script>
+"""
+
 HTML_SCRIPT = """
 <script>
 /* ====== 基本工具/常數 ====== */
@@ -196,8 +599,70 @@ function downloadText(filename, text){
 }
 
 /* ====== 全域狀態 ====== */
-let DATA = {};          // files[file][section][sidx] = [TokenRow...]
+let DATA = {};          // files[file][section][sidx] = Sentence（見下方「token 儲存」）
 let LABELS = new Set(); // BIO 標籤集合（含 'O'）
+let LABEL_TABLE = ['O'];               // 標籤碼 -> 標籤字串（所有句子共用）
+let LABEL_ID = new Map([['O', 0]]);    // 標籤字串 -> 標籤碼
+let SUMMARY_CACHE = new Map();                  // file -> 摘要 HTML 片段（標籤變更時失效）
+let STATS = {byEnt: {}, bySec: {}, byFile: {}}; // 實體片段計數器（隨標籤指派即時更新）
+
+/* ====== token 儲存 ====== */
+// 一句 = {text, start:Int32Array, end:Int32Array, lab:Uint16Array, over}
+// 原句字串只存一份；token 文字由 text.slice(start,end) 取得，
+// 只有 computeOffsets 走退路導致不一致時才記在 over[i]；lab 為 LABEL_TABLE 的索引
+function labelId(lab){
+  let id = LABEL_ID.get(lab);
+  if (id === undefined){ id = LABEL_TABLE.length; LABEL_TABLE.push(lab); LABEL_ID.set(lab, id); }
+  return id;
+}
+function makeSentence(text, toks){
+  // toks: [[token 文字, start, end], ...]
+  const n = toks.length;
+  const sent = {text, start: new Int32Array(n), end: new Int32Array(n), lab: new Uint16Array(n), over: null};
+  toks.forEach(([t,s,e],i)=>{
+    sent.start[i] = s; sent.end[i] = e;
+    if (text.slice(s,e) !== t) (sent.over = sent.over || {})[i] = t;
+  });
+  return sent;
+}
+function sentenceFromRows(rows){
+  // 由 token row（{text,start,end,label}，例如 Python 內嵌的 __INIT__）還原一句：
+  // 依 offset 把 token 文字擺回原位、空隙補空白，得到可切片的原句
+  const len = rows.reduce((m,r)=>Math.max(m, +r.end||0), 0);
+  const buf = new Array(len).fill(' ');
+  rows.forEach(r=>{ Array.from(String(r.text||'')).forEach((ch,k)=>{ if (+r.start+k < len) buf[+r.start+k] = ch; }); });
+  const sent = makeSentence(buf.join(''), rows.map(r=>[String(r.text||''), +r.start, +r.end]));
+  setSentenceLabels(sent, rows.map(r=>String(r.label||'O')));
+  return sent;
+}
+const tokCount = sent => sent.start.length;
+function tokText(sent, i){
+  return (sent.over && sent.over[i] != null) ? sent.over[i] : sent.text.slice(sent.start[i], sent.end[i]);
+}
+function tokLabel(sent, i){ return LABEL_TABLE[sent.lab[i]]; }
+function setSentenceLabels(sent, labs){ labs.forEach((l,i)=>{ sent.lab[i] = labelId(l); }); }
+function tokenRowsJSONL(fileNames, withLabels, keep){
+  // 匯出時才由 DATA 逐句組出 token row（欄位同 tokenizeSentence 舊版 record），不常駐記憶體
+  // keep(sent) 可選：只匯出回傳 true 的句子（例如 NER 中途停止時只取已完成的句子）
+  const lines=[];
+  fileNames.forEach(file=>{
+    const sections = DATA[file] || {};
+    Object.keys(sections).forEach(sec=>{
+      Object.keys(sections[sec]).forEach(sidx=>{
+        const sent = sections[sec][sidx];
+        if (keep && !keep(sent)) return;
+        for (let i=0; i<tokCount(sent); i++){
+          lines.push(JSON.stringify({
+            id: `${file}:${sec}:${sidx}:${i}`,
+            meta: {file, section:sec, source_span:[null,null], sentence_index:+sidx, token_index:i},
+            text: tokText(sent,i), start: sent.start[i], end: sent.end[i], label: withLabels ? tokLabel(sent,i) : 'O'
+          }));
+        }
+      });
+    });
+  });
+  return lines.join('\\n');
+}
 
 /* ====== 常見章節優先排序 ====== */
 const PREFERRED_SECTIONS = [
@@ -255,9 +720,9 @@ function renderLegend(){
     : '<span class="chip">No entities</span>';
 }
 function renderTOC(files){
-  // 目的：頁面頂部 TOC，列出每個 file 的錨點連結
+  // 目的：頁面頂部 TOC，列出每個 file 的錨點連結（files 為檔名陣列，含工作區中尚未載入的檔案）
   // 1) 以自然排序排列檔名
-  const names = Object.keys(files).sort(natCmp);
+  const names = files.slice().sort(natCmp);
   // 2) 產生 anchor 連結，連到 #file-<slug>
   $('#toc').innerHTML = names.map(f => `<a href="#file-${slug(f)}">${htmlEscape(f)}</a>`).join("");
 }
@@ -528,39 +993,107 @@ function splitOutsideParens(text){
   flush();
   return toks;
 }
-function tokenizeSentence(file, section, sidx, text){
-  // 將一句文字切成 token_rows：{text, start, end, label, meta}
+/* ====== 中文斷詞（字典最大匹配，與 Python Segmenter 相同） ====== */
+const CJK_RUN_RE = /[\\u3400-\\u9fff\\uf900-\\ufaff]+/g;
+let SEG_WORDS = new Set();  // 詞典（內嵌 init.dict + 使用者上傳）
+let SEG = null;             // {fwd, bwd}：正向 / 逆向 packed trie
+function buildPackedTrie(words){
+  // 壓縮 trie：以 BFS 編號，節點 n 的子節點為連續區間 [first[n], first[n+1])
+  // chars[c] 為進入節點 c 的字元（區間內已排序，可二分搜尋）；term[c]=1 表示根到 c 為完整詞
+  const ws = Array.from(new Set(words.filter(Boolean))).sort();
+  const chars=[0], first=[], term=[0];
+  const queue=[[0, ws.length, 0]];
+  for (let n=0; n<queue.length; n++){
+    const [lo, hi, d] = queue[n];
+    first.push(queue.length);
+    let i=lo;
+    while (i<hi && ws[i].length===d) i++;   // 與前綴等長的詞就是此節點本身
+    while (i<hi){
+      const c = ws[i].charCodeAt(d); let j=i;
+      while (j<hi && ws[j].charCodeAt(d)===c) j++;
+      chars.push(c); term.push(ws[i].length===d+1 ? 1 : 0);
+      queue.push([i, j, d+1]);
+      i=j;
+    }
+  }
+  first.push(queue.length);
+  return {chars: Uint16Array.from(chars), first: Int32Array.from(first), term: Uint8Array.from(term)};
+}
+function trieLongest(trie, text, i, step){
+  // 自 text[i] 起往 step 方向（+1 / -1）走，回傳最長完整詞長度（0 = 無）
+  let n=0, best=0, L=0;
+  for (let k=i; k>=0 && k<text.length; k+=step){
+    const c = text.charCodeAt(k);
+    let lo=trie.first[n], hi=trie.first[n+1];
+    const end = hi;
+    while (lo<hi){ const m=(lo+hi)>>1; if (trie.chars[m]<c) lo=m+1; else hi=m; }
+    if (lo===end || trie.chars[lo]!==c) break;
+    n=lo; L++;
+    if (trie.term[n]) best=L;
+  }
+  return best;
+}
+function buildSegmenter(){
+  const words = Array.from(SEG_WORDS);
+  SEG = {fwd: buildPackedTrie(words), bwd: buildPackedTrie(words.map(w=>Array.from(w).reverse().join('')))};
+}
+function segmentCJK(run){
+  // 雙向最大匹配：取詞數較少者；同詞數取單字較少者；再相同取逆向結果
+  const n = run.length, fmm=[], bmm=[];
+  for (let i=0; i<n; ){ const L = trieLongest(SEG.fwd, run, i, 1) || 1; fmm.push(run.slice(i, i+L)); i+=L; }
+  for (let j=n; j>0; ){ const L = trieLongest(SEG.bwd, run, j-1, -1) || 1; bmm.push(run.slice(j-L, j)); j-=L; }
+  bmm.reverse();
+  if (fmm.length !== bmm.length) return fmm.length < bmm.length ? fmm : bmm;
+  const singles = seq => seq.filter(w=>w.length===1).length;
+  return singles(fmm) < singles(bmm) ? fmm : bmm;
+}
+function splitChunk(chunk){
+  // 中文連續字串交給 segmentCJK；其餘（英數、標點）整段保留
+  const out=[]; let last=0;
+  for (const m of chunk.matchAll(CJK_RUN_RE)){
+    if (m.index > last) out.push(chunk.slice(last, m.index));
+    segmentCJK(m[0]).forEach(w=>out.push(w));
+    last = m.index + m[0].length;
+  }
+  if (last < chunk.length) out.push(chunk.slice(last));
+  return out;
+}
+function segmentWords(text){
+  // 先以空白切塊（尾隨空白黏在塊末），塊內再切中文；所有 token 直接相連即為原句
+  const toks=[]; let i=0; const n=text.length;
+  while (i<n){
+    let j = text.indexOf(' ', i); if (j<0) j=n;
+    let k = j; while (k<n && text[k]===' ') k++;
+    const pieces = splitChunk(text.slice(i, j));
+    if (pieces.length) pieces[pieces.length-1] += text.slice(j, k);
+    else if (k>j) pieces.push(text.slice(j, k));
+    pieces.forEach(p=>toks.push(p));
+    i = k;
+  }
+  return toks;
+}
+
+function tokenizeSentence(section, text){
+  // 將一句文字切成 Sentence（見「token 儲存」；標籤全為 O）
   // 規則：
-  // - WORD_SECTIONS（如過去病史等）使用「空白」切，保留緊貼
+  // - WORD_SECTIONS（如過去病史等）使用「空白」切，保留緊貼；中文連續字串再以字典最大匹配切分
   // - 其餘使用 splitOutsideParens
   let toks=[];
   if (WORD_SECTIONS.has(section)){
-    let i=0, n=text.length;
-    while(i<n){
-      let j=i; while(j<n && !/ /.test(text[j])) j++;
-      while(j<n && text[j]===' ') j++;
-      const token = text.slice(i,j);
-      if (token) toks.push(token);
-      i = j;
-    }
+    toks = segmentWords(text);
   } else {
     toks = splitOutsideParens(text);
   }
-  // 依原句定位每個 token 的 start/end，並包 meta
-  const recs=[]; let cursor=0;
-  toks.forEach((t,k)=>{
+  // 依原句定位每個 token 的 start/end
+  let cursor=0;
+  return makeSentence(text, toks.map(t=>{
     const [s,e] = computeOffsets(text, t, cursor);
-    recs.push({
-      id: `${file}:${section}:${sidx}:${k}`,
-      meta: {file, section, source_span:[null,null], sentence_index:sidx, token_index:k},
-      text: t, start: s, end: e, label: "O"
-    });
     cursor = e;
-  });
-  return recs;
+    return [t, s, e];
+  }));
 }
 function preprocessRawToData(raw, fileLabel){
-  // 原始病歷文字 → {files, segments, tokenRows}
+  // 原始病歷文字 → {files, segments}（token rows 於下載時才由 DATA 組出）
   // 步驟：
   // 1) findSections：找章節標頭
   const labels = findSections(raw);
@@ -591,52 +1124,111 @@ function preprocessRawToData(raw, fileLabel){
     const key = seg.file + "||" + seg.section;
     (buckets[key] = buckets[key] || []).push(seg.text);
   });
-  // 4) 產生 files 映射與 tokenRows 平鋪表
-  const files = {}; const tokenRows=[];
+  // 4) 產生 files 映射；同一切法下文字相同的句子只斷詞一次，共用 start/end（標籤各自獨立）
+  const files = {}, seen = new Map();
   Object.entries(buckets).forEach(([key, arr])=>{
     const [file, section] = key.split("||");
     arr.forEach((sent,i)=>{
-      const recs = tokenizeSentence(file, section, i, sent);
       (files[file] = files[file] || {});
       (files[file][section] = files[file][section] || {});
-      files[file][section][i] = recs.map(r => ({
-        text:r.text, start:r.start, end:r.end, label:r.label, meta:r.meta
-      }));
-      recs.forEach(r => tokenRows.push(r));
+      const tkey = (WORD_SECTIONS.has(section) ? 'W|' : 'S|') + sent;
+      const proto = seen.get(tkey);
+      if (proto){
+        files[file][section][i] = {text: proto.text, start: proto.start, end: proto.end,
+                                   lab: new Uint16Array(proto.lab.length), over: proto.over};
+      } else {
+        seen.set(tkey, files[file][section][i] = tokenizeSentence(section, sent));
+      }
     });
   });
-  // 5) 回傳渲染所需三份資料
-  return {files, segments, tokenRows};
+  // 5) 回傳渲染所需資料
+  return {files, segments};
 }
 
-/* ====== HF NER ====== */
-async function runNEROnFiles(files, model, token){
+/* ====== HF NER（優先序排程，可取消） ====== */
+// 待標註的句子依「可見且展開 → 已展開 → 收合」排序，同層內常見章節（PREFERRED_SECTIONS）優先；
+// 捲動或展開/收合章節時標記 dirty，取下一句前重新排序
+const NER_RUN = {ctrl: null, dirty: false};
+let SEC_EL = new Map();          // file||section -> 章節 <details>（rebuildPage 時建立）
+let VISIBLE_SECS = new Set();    // 目前在視窗內（含上下 200px）的章節 file||section
+let SEC_OBSERVER = null;
+function observeSection(key, el){
+  // 登記章節元素；以 IntersectionObserver 追蹤可見性（不支援時一律視為不可見）
+  SEC_EL.set(key, el);
+  el.dataset.key = key;
+  el.addEventListener('toggle', ()=>{ NER_RUN.dirty = true; });
+  if (typeof IntersectionObserver === 'undefined') return;
+  if (!SEC_OBSERVER) SEC_OBSERVER = new IntersectionObserver(entries=>{
+    entries.forEach(en=>{
+      if (en.isIntersecting) VISIBLE_SECS.add(en.target.dataset.key);
+      else VISIBLE_SECS.delete(en.target.dataset.key);
+    });
+    NER_RUN.dirty = true;
+  }, {rootMargin: '200px 0px'});
+  SEC_OBSERVER.observe(el);
+}
+function nerPriority(job){
+  // 數字越小越先：0 可見且展開、1 已展開、2 收合或尚未渲染；同層內依 PREFERRED_SECTIONS 順序
+  const key = job.file + '||' + job.sec, el = SEC_EL.get(key);
+  const tier = !el || !el.open ? 2 : VISIBLE_SECS.has(key) ? 0 : 1;
+  const pref = PREFERRED_SECTIONS.indexOf(job.sec);
+  return tier * 100 + (pref < 0 ? PREFERRED_SECTIONS.length : pref);
+}
+function normalizeWS(text){
+  // 空白正規化：連續空白併成一個空白並去頭尾（作為去重分組的 key）
+  return text.replace(/\\s+/g,' ').trim();
+}
+function wsPositionMap(text){
+  // normalizeWS(text) 第 i 字在原字串的位置；併成的空白對到原空白段的最後一字
+  const map = [], re = /\\S+/g;
+  let m;
+  while ((m = re.exec(text))){
+    if (map.length) map.push(m.index - 1);
+    for (let k=0; k<m[0].length; k++) map.push(m.index + k);
+  }
+  return map;
+}
+function paintSentence(file, sec, sidx, sent){
+  // 把一句的標籤畫進既有 token span（不重繪整頁）
+  for (let k=0; k<tokCount(sent); k++){
+    const span = TOK_EL.get([file, sec, sidx, k].join('||'));
+    if (span) paintToken(span, tokLabel(sent,k));
+  }
+}
+async function runNEROnFiles(files, model, token, opts={}){
   // 對 files 中每一句文字呼叫 HF Inference API 做 NER，並把 BIO 標籤寫回 token
+  // opts.signal：AbortSignal，取消後 fetch 以 AbortError 結束，已寫回的句子保留
+  // opts.onSentence(job, stats)：每句寫回後呼叫（job = {file, sec, sidx, sent}）
+  // 空白正規化後相同的句子（套版診斷、重複主訴…）只送一次 API，結果換算回各句位置後分送
+  // 回傳/回呼的 stats = {done, total, unique, calls, shared}：完成句數（含略過）、總句數、不重複句數、
+  // 實際 API 呼叫數、沿用同組結果而未呼叫 API 的句數（即省下的呼叫）
+  const {signal, onSentence} = opts;
   async function inferText(text){
     // 以 simple aggregation 拿 span，回傳陣列：[{start,end, entity_group, score, word}, ...]
     const resp = await fetch(`https://api-inference.huggingface.co/models/${encodeURIComponent(model)}`, {
-      method:'POST',
+      method:'POST', signal,
       headers:{'Authorization':`Bearer ${token}`,'Content-Type':'application/json'},
       body: JSON.stringify({inputs:text, parameters:{aggregation_strategy:"simple"}})
     });
     if(!resp.ok) throw new Error(`HF API ${resp.status}`);
     return await resp.json();
   }
-  function assignBIO(tokens, spans){
+  function assignBIO(sent, spans){
     // 將 HF 回傳的 spans 對齊本地 tokens，產生 BIO 序列
     // 原則：
     // - 計算 token 與 span 的重疊長度，取每個 token 最佳匹配
     // - 第一個重疊記 B-<ENT>，延續記 I-<ENT>
-    const labels = new Array(tokens.length).fill('O');
-    const best = new Array(tokens.length).fill(0);
+    const n = tokCount(sent);
+    const labels = new Array(n).fill('O');
+    const best = new Array(n).fill(0);
     spans.forEach(p=>{
       const s = +p.start, e = +p.end, lab = String(p.entity_group||p.entity||'ENT');
       const idxs=[];
-      tokens.forEach((t,i)=>{
-        const ts=+t.start, te=+t.end;
+      for (let i=0; i<n; i++){
+        const ts=sent.start[i], te=sent.end[i];
         const ov = Math.max(0, Math.min(te,e) - Math.max(ts,s));
         if (ov > 0) idxs.push([i, ov]);
-      });
+      }
       if(!idxs.length) return;
       idxs.sort((a,b)=>a[0]-b[0]);
       idxs.forEach(([i,ov],j)=>{
@@ -646,154 +1238,496 @@ async function runNEROnFiles(files, model, token){
     });
     return labels;
   }
-  // 逐 file / section / sentence 進行推論與回填
-  for(const file of Object.keys(files)){
-    for(const section of Object.keys(files[file])){
-      for(const sidx of Object.keys(files[file][section]).map(Number).sort((a,b)=>a-b)){
-        const toks = files[file][section][sidx];
-        // WORD_SECTIONS 以「直連」組句，其餘以空白連接
-        const sentText = (WORD_SECTIONS.has(section) ? toks.map(t=>t.text).join("") : toks.map(t=>t.text).join(" "));
-        const ents = await inferText(sentText);
-        const labs = assignBIO(toks, ents);
-        toks.forEach((t,i)=>{ t.label = labs[i]; LABELS.add(labs[i]); });
+  function apiText(job){
+    // WORD_SECTIONS 以「直連」組句，其餘以空白連接
+    const texts = Array.from({length: tokCount(job.sent)}, (_,i)=>tokText(job.sent,i));
+    return texts.join(WORD_SECTIONS.has(job.sec) ? "" : " ");
+  }
+  function remapSpans(ents, text, norm){
+    // 正規化文字 norm 上的 span 換回這一句原本的組句位置；文字未變時不必建位置表
+    if (norm === text) return ents;
+    const map = wsPositionMap(text);
+    return ents.map(p => (+p.end > +p.start && +p.end <= map.length)
+      ? {...p, start: map[+p.start], end: map[+p.end - 1] + 1} : p);
+  }
+  const live = job => files[job.file]?.[job.sec]?.[job.sidx] === job.sent;
+  // 1) 待辦清單：每句一筆；order 為檔案/章節/句序，作為同優先序時的次序
+  //    groups：正規化文字 -> 該文字的所有句子（雜湊表分組）
+  const queue = [], groups = new Map();
+  Object.keys(files).sort(natCmp).forEach(file=>{
+    Object.keys(files[file]).forEach(sec=>{
+      Object.keys(files[file][sec]).map(Number).sort((a,b)=>a-b).forEach(sidx=>{
+        const job = {file, sec, sidx, sent: files[file][sec][sidx], order: queue.length, pri: 0, done: false};
+        job.key = normalizeWS(apiText(job));
+        const g = groups.get(job.key);
+        if (g) g.push(job); else groups.set(job.key, [job]);
+        queue.push(job);
+      });
+    });
+  });
+  const stats = {done: 0, total: queue.length, unique: groups.size, calls: 0, shared: 0};
+  NER_RUN.dirty = true;
+  // 2) 依優先序取句；queue 依優先序遞減排列，由尾端取出
+  while (queue.length){
+    if (signal && signal.aborted) throw new DOMException('NER 已取消', 'AbortError');
+    if (NER_RUN.dirty){
+      NER_RUN.dirty = false;
+      queue.forEach(job => job.pri = nerPriority(job));
+      queue.sort((a,b) => b.pri - a.pri || b.order - a.order);
+    }
+    const job = queue.pop();
+    if (job.done) continue;   // 已由同組結果分送
+    // 執行期間該檔被重新斷詞覆蓋：舊句子不再屬於 DATA，略過
+    if (!live(job)){ job.done = true; stats.done++; continue; }
+    const ents = await inferText(job.key);
+    stats.calls++;
+    // 3) 分送給同組所有尚未完成的句子（含本句），各句以自己的 token 位置對齊
+    for (const j of groups.get(job.key)){
+      if (j.done) continue;
+      j.done = true; stats.done++;
+      if (!live(j)) continue;
+      if (j !== job) stats.shared++;
+      relabelSentence(j.file, j.sec, j.sent, assignBIO(j.sent, remapSpans(ents, apiText(j), j.key)));
+      if (onSentence) onSentence(j, stats);
+    }
+  }
+  return stats;
+}
+
+/* ====== 搜尋：倒排索引 ====== */
+// 詞項 -> hitId 陣列；hit = [file, section, sidx, tidx, 世代]
+// 檔案重新斷詞/標註時世代 +1，舊 hit 於查詢時略過，失效過多再整批重建
+const SEARCH = {hits: [], postings: new Map(), terms: [], termsDirty: false, gen: {}, count: {}, stale: 0};
+const CJK_GRAM = 8;   // 中文每個起點最多索引 8 字（子字串前綴查詢）
+let SEARCH_RESULTS = [];
+let TOK_EL = new Map(); // file||section||sidx||tidx -> token span（rebuildPage 時建立）
+function searchTerms(text){
+  // 將文字拆成詞項：英數字詞小寫；中文連續字串每個起點取至多 CJK_GRAM 字
+  const low = String(text||'').toLowerCase();
+  const out = new Set(low.match(/[a-z0-9\\u00c0-\\u024f]+/g) || []);
+  (low.match(/[\\u3400-\\u9fff\\uf900-\\ufaff]+/g) || []).forEach(run=>{
+    for (let i=0; i<run.length; i++) out.add(run.slice(i, i+CJK_GRAM));
+  });
+  return out;
+}
+function addPosting(term, hitId){
+  let arr = SEARCH.postings.get(term);
+  if (!arr){ arr = []; SEARCH.postings.set(term, arr); SEARCH.terms.push(term); SEARCH.termsDirty = true; }
+  arr.push(hitId);
+}
+function indexFile(file){
+  // 將單一檔案加入索引（重複呼叫即覆蓋該檔舊索引）
+  const sections = DATA[file]; if (!sections) return;
+  const gen = SEARCH.gen[file] = (SEARCH.gen[file] || 0) + 1;
+  SEARCH.stale += SEARCH.count[file] || 0;
+  let n = 0;
+  Object.keys(sections).forEach(sec=>{
+    Object.keys(sections[sec]).forEach(sidx=>{
+      const sent = sections[sec][sidx];
+      for (let k=0; k<tokCount(sent); k++){
+        const hitId = SEARCH.hits.length;
+        SEARCH.hits.push([file, sec, +sidx, k, gen]); n++;
+        searchTerms(tokText(sent,k)).forEach(term => addPosting(term, hitId));
+        const lab = tokLabel(sent,k);
+        if (lab !== 'O') addPosting('@' + lab.replace(/^([BI]-)/,'').toLowerCase(), hitId);
       }
+    });
+  });
+  SEARCH.count[file] = n;
+  // 失效 hit 超過一半時整批重建，避免索引無限成長
+  if (SEARCH.stale > SEARCH.hits.length / 2) rebuildSearchIndex();
+}
+function rebuildSearchIndex(){
+  Object.assign(SEARCH, {hits: [], postings: new Map(), terms: [], termsDirty: false, count: {}, stale: 0});
+  Object.keys(DATA).forEach(file=>{ SEARCH.gen[file] = 0; indexFile(file); });
+}
+function prefixHits(prefix){
+  // 二分搜尋排序詞項，合併所有以 prefix 開頭的 posting
+  if (SEARCH.termsDirty){ SEARCH.terms.sort(); SEARCH.termsDirty = false; }
+  const terms = SEARCH.terms;
+  let lo = 0, hi = terms.length;
+  while (lo < hi){ const mid = (lo+hi) >> 1; if (terms[mid] < prefix) lo = mid+1; else hi = mid; }
+  const out = new Set();
+  for (let i=lo; i<terms.length && terms[i].startsWith(prefix); i++){
+    SEARCH.postings.get(terms[i]).forEach(h => out.add(h));
+  }
+  return out;
+}
+function searchQuery(q){
+  // 查詢語法：空白分隔，全部條件 AND；「@實體」比對實體類型字首，其餘比對 token 文字字首
+  const sets = [];
+  const checks = [];
+  (q||'').trim().toLowerCase().split(/\\s+/).filter(Boolean).forEach(part=>{
+    if (part[0] === '@'){ if (part.length > 1) sets.push(prefixHits(part)); return; }
+    // 英數字詞整個當字首；中文連續字串只取開頭 CJK_GRAM 字（索引已含每個起點）
+    (part.match(/[a-z0-9\\u00c0-\\u024f]+/g) || []).forEach(w => sets.push(prefixHits(w)));
+    (part.match(/[\\u3400-\\u9fff\\uf900-\\ufaff]+/g) || []).forEach(run=>{
+      sets.push(prefixHits(run.slice(0, CJK_GRAM)));
+      if (run.length > CJK_GRAM) checks.push(run);   // 超過索引長度，以原文再確認
+    });
+  });
+  if (!sets.length) return [];
+  sets.sort((a,b)=>a.size-b.size);
+  const out = [];
+  sets[0].forEach(h=>{
+    const hit = SEARCH.hits[h];
+    if (SEARCH.gen[hit[0]] !== hit[4]) return;          // 失效（該檔已重建）
+    for (let i=1; i<sets.length; i++) if (!sets[i].has(h)) return;
+    if (checks.length){
+      const t = String(searchTokenOf(hit).text||'').toLowerCase();
+      if (!checks.every(c => t.includes(c))) return;
     }
+    out.push(h);
+  });
+  return out.sort((a,b)=>a-b);
+}
+function searchTokenOf(hit){
+  const [file, sec, sidx, k] = hit;
+  const sent = DATA[file][sec][sidx];
+  return {text: tokText(sent,k), label: tokLabel(sent,k)};
+}
+const SEARCH_ROW_H = 28;
+function renderSearchWindow(){
+  // 虛擬清單：只渲染捲動視窗內（加少量緩衝）的結果列
+  const box = $('#searchResults'); if(!box) return;
+  const spacer = box.firstElementChild;
+  spacer.style.height = (SEARCH_RESULTS.length * SEARCH_ROW_H) + 'px';
+  const first = Math.max(0, Math.floor(box.scrollTop / SEARCH_ROW_H) - 5);
+  const last  = Math.min(SEARCH_RESULTS.length, first + Math.ceil((box.clientHeight || 260) / SEARCH_ROW_H) + 10);
+  let html = '';
+  for (let i=first; i<last; i++){
+    const h = SEARCH_RESULTS[i], hit = SEARCH.hits[h], t = searchTokenOf(hit);
+    const lab = String(t.label||'O');
+    const ent = lab==='O' ? '' : `<span class="tag-badge" style="margin-left:6px;font-size:11px;padding:0 6px;border:1px solid var(--line);border-radius:999px">${htmlEscape(lab.replace(/^([BI]-)/,''))}</span>`;
+    html += `<div class="search-row" data-hit="${h}" style="top:${i*SEARCH_ROW_H}px">${htmlEscape(t.text)}${ent}`
+          + `<span class="where">${htmlEscape(hit[0])} · ${htmlEscape(hit[1])} · #${hit[2]}</span></div>`;
   }
+  $$('#searchResults .search-row').forEach(e=>e.remove());
+  spacer.insertAdjacentHTML('afterend', html);
+}
+function runSearch(){
+  const q = $('#searchBox').value;
+  const t0 = performance.now();
+  SEARCH_RESULTS = searchQuery(q);
+  const ms = performance.now() - t0;
+  $('#searchInfo').textContent = q.trim() ? `${SEARCH_RESULTS.length} 筆 · ${ms.toFixed(2)} ms` : '';
+  $('#searchResults').scrollTop = 0;
+  renderSearchWindow();
+}
+function jumpToHit(h){
+  // 展開所在章節/句子，捲動到 token 並加上高亮
+  const [file, sec, sidx, k] = SEARCH.hits[h];
+  const el = TOK_EL.get([file, sec, sidx, k].join('||')); if(!el) return;
+  $$('.tok.tok-hit').forEach(e=>e.classList.remove('tok-hit'));
+  for (let p=el.parentElement; p; p=p.parentElement) if (p.tagName === 'DETAILS') p.open = true;
+  el.classList.add('tok-hit');
+  el.scrollIntoView({block:'center'});
 }
 
 /* ====== 渲染 ====== */
+function entityGroups(sec, sent){
+  // 將連續 I-* 與前一個 B-* 併為片段：[{ent, text}, ...]
+  let cur=null; const groups=[];
+  const joiner = (sec==="過去病史"||sec==="住院治療經過") ? '' : ' ';
+  for (let i=0; i<tokCount(sent); i++){
+    const lab = tokLabel(sent,i);
+    if (lab==='O'){ cur=null; continue; }
+    const ent = lab.replace(/^([BI]-)/,'');
+    if (lab.startsWith('B-') || !cur || cur.ent!==ent){
+      cur = {ent, text: tokText(sent,i)};
+      groups.push(cur);
+    } else {
+      cur.text += joiner + tokText(sent,i);
+    }
+  }
+  return groups;
+}
+function countSentence(file, sec, sent, sign){
+  // 以片段為單位增減統計計數器（sign = +1 / -1），計數歸零即移除鍵
+  const bump = (obj, k) => { obj[k] = (obj[k]||0) + sign; if (!obj[k]) delete obj[k]; };
+  entityGroups(sec, sent).forEach(g=>{ bump(STATS.byEnt, g.ent); bump(STATS.bySec, sec); bump(STATS.byFile, file); });
+}
+function countFile(file, sign){
+  const sections = DATA[file] || {};
+  Object.keys(sections).forEach(sec=>Object.values(sections[sec]).forEach(sent=>countSentence(file, sec, sent, sign)));
+}
+function setFileData(file, sections){
+  // 檔案進入（或覆蓋）DATA：同步更新計數器、摘要快取與搜尋索引
+  // 工作區中尚未載入的同名檔案，其計數來自 meta，先扣掉
+  if (DATA[file]) countFile(file, -1);
+  else if (WS.meta.has(file)) applyMetaCounts(WS.meta.get(file), -1);
+  DATA[file] = sections;
+  countFile(file, +1);
+  SUMMARY_CACHE.delete(file);
+  indexFile(file);
+}
+function relabelSentence(file, sec, sent, labs){
+  // 寫回一句的 BIO 標籤；先扣掉舊片段再加入新片段，並使該檔摘要失效
+  countSentence(file, sec, sent, -1);
+  setSentenceLabels(sent, labs);
+  labs.forEach(l => LABELS.add(l));
+  countSentence(file, sec, sent, +1);
+  SUMMARY_CACHE.delete(file);
+}
+function summaryFragment(file){
+  // 單一檔案的摘要 HTML；結果以 file 為鍵快取，直到該檔標籤變更
+  if (SUMMARY_CACHE.has(file)) return SUMMARY_CACHE.get(file);
+  const sections = DATA[file] || {};
+  const buckets = {}; // section -> [{ent,text}, ...]
+  Object.keys(sections).forEach(sec=>{
+    buckets[sec] = [];
+    Object.keys(sections[sec]).map(Number).sort((a,b)=>a-b).forEach(sidx=>{
+      entityGroups(sec, sections[sec][sidx]).forEach(g => buckets[sec].push(g));
+    });
+  });
+  // 章節排序：常見章節優先，其餘依字母序
+  const orderedSecs = [
+    ...new Set([
+      ...PREFERRED_SECTIONS.filter(n => buckets[n]?.length),
+      ...Object.keys(buckets).sort().filter(n => !PREFERRED_SECTIONS.includes(n))
+    ])
+  ];
+  // 總片段數
+  let total = 0; orderedSecs.forEach(s => total += (buckets[s]||[]).length);
+  // 組 HTML
+  let html = `<div class="sum-file"><div class="name">${htmlEscape(file)} · 標註片段 <b>${total}</b></div>`;
+  orderedSecs.forEach(cs=>{
+    const arr = buckets[cs]||[]; if(!arr.length) return;
+    html += `<div class="sum-sec"><div class="sec-title">[${htmlEscape(cs)}]</div><ul class="sum-list">`;
+    arr.forEach(r=>{
+      html += `<li>${htmlEscape(r.text)}<span class="tag-badge" style="margin-left:8px;font-size:11px;padding:1px 6px;border:1px solid var(--line);border-radius:999px;background:#f9fafb;color:#111">${htmlEscape(r.ent)}</span></li>`;
+    });
+    html += `</ul></div>`;
+  });
+  html += `</div>`;
+  SUMMARY_CACHE.set(file, html);
+  return html;
+}
 function rebuildSummary(){
-  // 目的：依 DATA 聚合每 file/section 的連續實體片段，產出右欄摘要清單
+  // 目的：右欄摘要清單；各檔片段取自快取，只有標籤變更過的檔案才重新走訪 token
   const box = $('#annSummary'); if(!box) return;
-  let html = '';
-  const orderedFiles = Object.keys(DATA).sort(natCmp);
-  orderedFiles.forEach(file=>{
-    const sections = DATA[file] || {};
-    const buckets = {}; // section -> [{ent,text}, ...]
-    Object.keys(sections).forEach(sec=>{
-      (buckets[sec] = buckets[sec] || []);
-      Object.keys(sections[sec]).map(Number).sort((a,b)=>a-b).forEach(sidx=>{
-        const toks = sections[sec][sidx] || [];
-        // 將連續 I-* 與前一個 B-* 併為片段
-        let cur=null; const groups=[];
-        toks.forEach(t=>{
-          const lab = String(t.label||'O');
-          if (lab==='O'){ cur=null; return; }
-          const ent = lab.replace(/^([BI]-)/,'');
-          const piece = t.text;
-          const joiner = (sec==="過去病史"||sec==="住院治療經過") ? '' : ' ';
-          if (lab.startsWith('B-') || !cur || cur.ent!==ent){
-            cur = {ent, text: piece};
-            groups.push(cur);
-          } else {
-            cur.text += joiner + piece;
-          }
-        });
-        groups.forEach(g => buckets[sec].push({ent:g.ent, text:g.text}));
-      });
+  const html = workspaceFiles().map(summaryFragment).join('');
+  box.innerHTML = html || '<div class="intro">（尚無標註可摘要）</div>';
+  renderStats();
+}
+function renderStats(){
+  // 統計檢視：直接讀取計數器（實體類型 / 章節 / 檔案），不走訪 token
+  const box = $('#annStats'); if(!box) return;
+  const table = (title, obj) => {
+    const keys = Object.keys(obj).sort((a,b)=>obj[b]-obj[a] || natCmp(a,b));
+    if (!keys.length) return '';
+    return `<div class="sec-title">${title}</div><table class="stats">`
+      + keys.map(k=>`<tr><td>${htmlEscape(k)}</td><td>${obj[k]}</td></tr>`).join('') + `</table>`;
+  };
+  const html = table('實體類型', STATS.byEnt) + table('章節', STATS.bySec) + table('檔案', STATS.byFile);
+  box.innerHTML = html || '<div class="intro">（尚無實體）</div>';
+}
+/* ====== 工作區（IndexedDB） ====== */
+// 每個檔案斷詞或 NER 完成後寫入 IndexedDB（callback 式 API）：
+//   files：{file, sections, labelTable, segments}；Sentence 的 typed array 可直接 structured clone
+//   meta ：{file, tokens, sections, labels, counts, summary}；TOC、摘要與統計只需要這些
+// 開啟頁面時只讀 meta，檔案展開時才讀該檔的 token，不把整個工作區載入記憶體
+const WS = {db: null, meta: new Map()};   // meta：file -> meta 紀錄（含尚未載入 DATA 的檔案）
+function workspaceFiles(){
+  // DATA 與工作區的檔名聯集（自然排序）
+  return Array.from(new Set([...Object.keys(DATA), ...WS.meta.keys()])).sort(natCmp);
+}
+function wsOpen(cb){
+  // 開啟資料庫，cb(db)；不支援或失敗時 cb(null)，頁面照常運作只是不保存
+  // 資料庫以頁面路徑命名：不同報告檔各有自己的工作區
+  if (typeof indexedDB === 'undefined') return cb(null);
+  const req = indexedDB.open('ner-workspace:' + location.pathname, 1);
+  req.onupgradeneeded = () => {
+    req.result.createObjectStore('meta', {keyPath: 'file'});
+    req.result.createObjectStore('files', {keyPath: 'file'});
+  };
+  req.onsuccess = () => { WS.db = req.result; cb(WS.db); };
+  req.onerror = () => { console.error(req.error); cb(null); };
+}
+function fileMeta(file){
+  // 由 DATA[file] 算出 meta：token/章節數、用到的標籤、計數器貢獻與摘要片段
+  const sections = DATA[file], labels = new Set(['O']);
+  const counts = {byEnt: {}, bySec: {}, total: 0};
+  let tokens = 0;
+  Object.keys(sections).forEach(sec=>Object.values(sections[sec]).forEach(sent=>{
+    tokens += tokCount(sent);
+    for (let k=0; k<tokCount(sent); k++) labels.add(tokLabel(sent,k));
+    entityGroups(sec, sent).forEach(g=>{
+      counts.byEnt[g.ent] = (counts.byEnt[g.ent]||0) + 1;
+      counts.bySec[sec] = (counts.bySec[sec]||0) + 1;
+      counts.total++;
     });
-    // 章節排序：常見章節優先，其餘依字母序
-    const orderedSecs = [
-      ...new Set([
-        ...PREFERRED_SECTIONS.filter(n => buckets[n]?.length),
-        ...Object.keys(buckets).sort().filter(n => !PREFERRED_SECTIONS.includes(n))
-      ])
-    ];
-    // 總片段數
-    let total = 0; orderedSecs.forEach(s => total += (buckets[s]||[]).length);
-    // 組 HTML
-    html += `<div class="sum-file"><div class="name">${htmlEscape(file)} · 標註片段 <b>${total}</b></div>`;
-    orderedSecs.forEach(cs=>{
-      const arr = buckets[cs]||[]; if(!arr.length) return;
-      html += `<div class="sum-sec"><div class="sec-title">[${htmlEscape(cs)}]</div><ul class="sum-list">`;
-      arr.forEach(r=>{
-        html += `<li>${htmlEscape(r.text)}<span class="tag-badge" style="margin-left:8px;font-size:11px;padding:1px 6px;border:1px solid var(--line);border-radius:999px;background:#f9fafb;color:#111">${htmlEscape(r.ent)}</span></li>`;
-      });
-      html += `</ul></div>`;
+  }));
+  return {file, tokens, sections: Object.keys(sections), labels: Array.from(labels), counts, summary: summaryFragment(file)};
+}
+function applyMetaCounts(meta, sign){
+  // 以 meta 中的計數增減 STATS（未載入的檔案不走訪 token）
+  const add = (obj, k, n) => { obj[k] = (obj[k]||0) + sign * n; if (!obj[k]) delete obj[k]; };
+  Object.keys(meta.counts.byEnt).forEach(k => add(STATS.byEnt, k, meta.counts.byEnt[k]));
+  Object.keys(meta.counts.bySec).forEach(k => add(STATS.bySec, k, meta.counts.bySec[k]));
+  if (meta.counts.total) add(STATS.byFile, meta.file, meta.counts.total);
+}
+function wsSaveFile(file, segments){
+  // 寫入一個檔案（meta + files 同一交易）；segments 省略時沿用已存的 segments
+  if (!WS.db || !DATA[file]) return;
+  const meta = fileMeta(file);
+  const rec = {file, sections: DATA[file], labelTable: LABEL_TABLE.slice(), segments: segments || []};
+  const tx = WS.db.transaction(['meta', 'files'], 'readwrite');
+  const store = tx.objectStore('files');
+  tx.objectStore('meta').put(meta);
+  if (segments) store.put(rec);
+  else store.get(file).onsuccess = e => { if (e.target.result) rec.segments = e.target.result.segments; store.put(rec); };
+  tx.onerror = () => console.error(tx.error);
+  WS.meta.set(file, meta);
+}
+function wsLoadMeta(cb){
+  // 讀入所有 meta（不含 token）：登記 TOC/摘要/統計，cb(新增檔數)；已在 DATA 的檔案以記憶體為準
+  const req = WS.db.transaction('meta').objectStore('meta').getAll();
+  req.onsuccess = () => {
+    let n = 0;
+    req.result.forEach(meta=>{
+      if (DATA[meta.file] || WS.meta.has(meta.file)) return;
+      WS.meta.set(meta.file, meta);
+      applyMetaCounts(meta, +1);
+      SUMMARY_CACHE.set(meta.file, meta.summary);
+      meta.labels.forEach(l => LABELS.add(l));
+      n++;
     });
-    html += `</div>`;
+    cb(n);
+  };
+  req.onerror = () => { console.error(req.error); cb(0); };
+}
+function wsLoadFile(file, cb){
+  // 讀回一個檔案的 token 放進 DATA，cb(成功與否)；標籤碼依存檔時的 labelTable 轉成目前的碼
+  const req = WS.db.transaction('files').objectStore('files').get(file);
+  req.onsuccess = () => {
+    const rec = req.result;
+    if (!rec){ cb(false); return; }
+    const remap = rec.labelTable.map(labelId);
+    if (remap.some((id, i) => id !== i)){
+      Object.values(rec.sections).forEach(sentmap=>Object.values(sentmap).forEach(sent=>{
+        for (let k=0; k<sent.lab.length; k++) sent.lab[k] = remap[sent.lab[k]];
+      }));
+    }
+    rec.labelTable.forEach(l => LABELS.add(l));
+    setFileData(file, rec.sections);
+    cb(true);
+  };
+  req.onerror = () => { console.error(req.error); cb(false); };
+}
+function openWorkspaceFile(file, block){
+  // 展開尚未載入的檔案：自 IndexedDB 讀回 token，換成完整的檔案區塊
+  if (block.dataset.loading) return;
+  block.dataset.loading = '1';
+  wsLoadFile(file, ok=>{
+    if (!ok){ block.dataset.loading = ''; return; }
+    block.replaceWith(fileBlock(file));
+    dynBIO(); renderLegend(); rebuildSummary(); bindLegendToggles(); runSearch();
   });
-  box.innerHTML = html || '<div class="intro">（尚無標註可摘要）</div>';
+}
+
+function paintToken(span, lab){
+  // token span 的 class：lab-<BIO> 與 ent-<實體>；保留搜尋跳轉的 tok-hit 標記
+  const ent = lab==='O' ? 'O' : lab.replace(/^([BI]-)/,'');
+  const labCls = lab==='O' ? 'O' : `lab-${lab.replace(/[^\\w-]/g,'-')}`;
+  const hit = span.classList.contains('tok-hit') ? ' tok-hit' : '';
+  span.className = `tok ${labCls} ent-${ent.replace(/[^\\w-]/g,'-')} ${lab==='O'?'O':''}${hit}`;
+  span.dataset.ent = ent; span.dataset.label = lab;
 }
 function rebuildPage(){
   // 整體重繪：樣式 → Legend/TOC → 主體檔案/章節/句子 → 摘要 → 綁定 Legend
   dynBIO();             // 更新/覆寫 BIO 樣式
   renderLegend();       // 重繪圖例
-  renderTOC(DATA);      // 重繪 TOC
+  renderTOC(workspaceFiles()); // 重繪 TOC
   $$('.file-block.rendered').forEach(e=>e.remove()); // 清掉舊內容
+  TOK_EL = new Map();   // 搜尋跳轉與 NER 逐句上色用的 token 對照
+  if (SEC_OBSERVER) SEC_OBSERVER.disconnect();
+  SEC_EL = new Map(); VISIBLE_SECS = new Set();
+
+  workspaceFiles().forEach(file => document.querySelector('#mainCol').appendChild(fileBlock(file)));
 
-  const orderedFiles = Object.keys(DATA).sort(natCmp);
-  orderedFiles.forEach(file=>{
-    const sections = DATA[file];
-    // 統計 token/section 數供標頭顯示
-    let tokCnt = 0, secNames = Object.keys(sections);
-    Object.values(sections).forEach(sentmap=>Object.values(sentmap).forEach(toks=>tokCnt+=toks.length));
-    // 建立容器
-    const block = document.createElement('div');
+  rebuildSummary();     // 右欄摘要
+  bindLegendToggles();  // 綁定圖例切換
+  runSearch();          // 結果列隨新內容更新
+}
+function fileBlock(file){
+  // 單一檔案的區塊；工作區中尚未載入的檔案只畫標頭（取自 meta），展開時才載入 token
+  if (!DATA[file]){
+    const meta = WS.meta.get(file);
+    const block = document.createElement('details');
     block.className = 'file-block rendered'; block.id = `file-${slug(file)}`;
     block.innerHTML = `
-      <div class="file-head"><div class="file-title">${htmlEscape(file)}</div>
-        <div class="file-sub">tokens: <b>${tokCnt}</b> · sections: <b>${secNames.length}</b></div>
-      </div>
-      <div class="file-body"></div>`;
-    const body = block.querySelector('.file-body');
-
-    // 章節排序：常見優先，其餘字母序
-    const seen=new Set(); const orderedSecs=[];
-    PREFERRED_SECTIONS.forEach(n=>{ if(sections[n] && !seen.has(n)){ orderedSecs.push(n); seen.add(n);} });
-    Object.keys(sections).sort().forEach(n=>{ if(!seen.has(n)){ orderedSecs.push(n); seen.add(n);} });
-
-    // 逐章節、逐句子、逐 token 渲染
-    orderedSecs.forEach(sec=>{
-      const secEl = document.createElement('details');
-      secEl.className='section'; secEl.open=true;
-      secEl.innerHTML = `<summary>${htmlEscape(sec)}</summary><div class="sec-inner"></div>`;
-      const inner = secEl.querySelector('.sec-inner');
-
-      const sentIdx = Object.keys(sections[sec]).map(Number).sort((a,b)=>a-b);
-      sentIdx.forEach(sidx=>{
-        const toks = sections[sec][sidx];
-        const sent = document.createElement('details');
-        sent.className='sentence'; sent.open=true;
-        sent.innerHTML = `<summary>tokens: ${toks.length}</summary><div class="sent-body"></div>`;
-        const sbody = sent.querySelector('.sent-body');
-
-        // token span：套上 lab-<BIO> 與 ent-<實體> 兩種 class
-        toks.forEach(rec=>{
-          const lab = String(rec.label||'O');
-          const ent = lab==='O' ? 'O' : lab.replace(/^([BI]-)/,'');
-          LABELS.add(lab);
-          const labCls = lab==='O' ? 'O' : `lab-${lab.replace(/[^\\w-]/g,'-')}`;
-          const span = document.createElement('span');
-          span.className = `tok ${labCls} ent-${ent.replace(/[^\\w-]/g,'-')} ${lab==='O'?'O':''}`;
-          span.dataset.ent = ent; span.dataset.label = lab;
-          span.innerHTML = htmlEscape(rec.text).replace(/ /g,'&nbsp;'); // 保留空白視覺
-          sbody.appendChild(span);
-        });
-        inner.appendChild(sent);
-      });
-      body.appendChild(secEl);
-    });
+      <summary class="file-head" style="cursor:pointer"><div class="file-title">${htmlEscape(file)}</div>
+        <div class="file-sub">tokens: <b>${meta.tokens}</b> · sections: <b>${meta.sections.length}</b> · 展開以載入</div>
+      </summary>`;
+    block.addEventListener('toggle', ()=>{ if (block.open) openWorkspaceFile(file, block); });
+    return block;
+  }
+  const sections = DATA[file];
+  // 統計 token/section 數供標頭顯示
+  let tokCnt = 0, secNames = Object.keys(sections);
+  Object.values(sections).forEach(sentmap=>Object.values(sentmap).forEach(sent=>tokCnt+=tokCount(sent)));
+  // 建立容器
+  const block = document.createElement('div');
+  block.className = 'file-block rendered'; block.id = `file-${slug(file)}`;
+  block.innerHTML = `
+    <div class="file-head"><div class="file-title">${htmlEscape(file)}</div>
+      <div class="file-sub">tokens: <b>${tokCnt}</b> · sections: <b>${secNames.length}</b></div>
+    </div>
+    <div class="file-body"></div>`;
+  const body = block.querySelector('.file-body');
 
-    document.querySelector('#mainCol').appendChild(block);
-  });
+  // 章節排序：常見優先，其餘字母序
+  const seen=new Set(); const orderedSecs=[];
+  PREFERRED_SECTIONS.forEach(n=>{ if(sections[n] && !seen.has(n)){ orderedSecs.push(n); seen.add(n);} });
+  Object.keys(sections).sort().forEach(n=>{ if(!seen.has(n)){ orderedSecs.push(n); seen.add(n);} });
 
-  rebuildSummary();     // 右欄摘要
-  bindLegendToggles();  // 綁定圖例切換
+  // 逐章節、逐句子、逐 token 渲染
+  orderedSecs.forEach(sec=>{
+    const secEl = document.createElement('details');
+    secEl.className='section'; secEl.open=true;
+    secEl.innerHTML = `<summary>${htmlEscape(sec)}</summary><div class="sec-inner"></div>`;
+    const inner = secEl.querySelector('.sec-inner');
+    observeSection(file + '||' + sec, secEl);
+
+    const sentIdx = Object.keys(sections[sec]).map(Number).sort((a,b)=>a-b);
+    sentIdx.forEach(sidx=>{
+      const rec = sections[sec][sidx];
+      const sent = document.createElement('details');
+      sent.className='sentence'; sent.open=true;
+      sent.innerHTML = `<summary>tokens: ${tokCount(rec)}</summary><div class="sent-body"></div>`;
+      const sbody = sent.querySelector('.sent-body');
+
+      // token span：套上 lab-<BIO> 與 ent-<實體> 兩種 class
+      for (let k=0; k<tokCount(rec); k++){
+        const lab = tokLabel(rec,k);
+        LABELS.add(lab);
+        const span = document.createElement('span');
+        paintToken(span, lab);
+        span.innerHTML = htmlEscape(tokText(rec,k)).replace(/ /g,'&nbsp;'); // 保留空白視覺
+        sbody.appendChild(span);
+        TOK_EL.set([file, sec, sidx, k].join('||'), span);
+      }
+      inner.appendChild(sent);
+    });
+    body.appendChild(secEl);
+  });
+  return block;
 }
 
 /* ====== 下載 ====== */
 function enableDownloads(obj){
   // 依是否有資料啟用下載按鈕；點擊時動態產生 JSONL 文字檔
+  // tokenRows / labeled 為函式：點擊當下才由 DATA 組出 JSONL，不另存一份 token 副本
   $('#dlSegments').disabled = !obj.segments;
   $('#dlTokens').disabled   = !obj.tokenRows;
   $('#dlLabeled').disabled  = !obj.labeled;
   if (obj.segments) $('#dlSegments').onclick = () =>
     downloadText('segments.jsonl', obj.segments.map(o=>JSON.stringify(o)).join('\\n'));
   if (obj.tokenRows) $('#dlTokens').onclick   = () =>
-    downloadText('ner_token_rows.jsonl', obj.tokenRows.map(o=>JSON.stringify(o)).join('\\n'));
+    downloadText('ner_token_rows.jsonl', obj.tokenRows());
   if (obj.labeled)   $('#dlLabeled').onclick  = () =>
-    downloadText('ner_labeled.jsonl', obj.labeled.map(o=>JSON.stringify(o)).join('\\n'));
+    downloadText('ner_labeled.jsonl', obj.labeled());
 }
 
 /* ====== 事件 ====== */
@@ -803,12 +1737,14 @@ $('#btnPreprocess').addEventListener('click', ()=>{
   const fname = $('#inFileName').value || 'pasted.txt';
   if (!txt.trim()){ $('#inStatus').textContent='請先貼上文字'; return; }
   $('#inStatus').textContent='處理中（斷段 + 分詞）…';
-  const {files, segments, tokenRows} = preprocessRawToData(txt, fname);
-  DATA[fname] = files[fname];   // 寫入全域 DATA
+  const {files, segments} = preprocessRawToData(txt, fname);
+  setFileData(fname, files[fname]); // 寫入全域 DATA（同步計數器/摘要/搜尋索引）
   LABELS.add('O');              // 至少有 O
   rebuildPage();                // 重新渲染
+  wsSaveFile(fname, segments);  // 存入工作區
   $('#inStatus').textContent='完成（未做 NER）';
   // 下載：segments / tokenRows（labeled 先以 tokenRows 佔位）
+  const tokenRows = () => tokenRowsJSONL([fname], false);
   enableDownloads({segments, tokenRows, labeled: tokenRows});
 });
 $('#btnRunNER').addEventListener('click', async ()=>{
@@ -819,35 +1755,94 @@ $('#btnRunNER').addEventListener('click', async ()=>{
   const token = $('#inToken').value.trim();
   if (!txt.trim()){ $('#inStatus').textContent='請先貼上文字'; return; }
   if (!token){     $('#inStatus').textContent='請填 Hugging Face Token'; return; }
+  if (NER_RUN.ctrl) NER_RUN.ctrl.abort();   // 前一次執行尚未結束：先取消
+  const ctrl = NER_RUN.ctrl = new AbortController();
   $('#inStatus').textContent='處理中（斷段 + 分詞 + NER）…';
-  const {files, segments, tokenRows} = preprocessRawToData(txt, fname);
-  DATA[fname] = files[fname];
+  const {files, segments} = preprocessRawToData(txt, fname);
+  setFileData(fname, files[fname]);
   LABELS = new Set(['O']);      // 重新計算 LABELS
+  rebuildPage();                // 先畫出未標註的 token，NER 結果逐句補上顏色
+  // 下載於執行中即可使用；labeled 只含本次已完成 NER 的句子，中途停止也能匯出部分結果
+  const finished = new WeakSet();
+  const labeledFiles = Object.keys(DATA);
+  const touched = new Set();    // 本次有句子寫回標籤的檔案：結束時只重建這些檔的索引
+  const tokenRows = () => tokenRowsJSONL([fname], false);
+  const labeled   = () => tokenRowsJSONL(labeledFiles, true, sent => finished.has(sent));
+  enableDownloads({segments, tokenRows, labeled});
+  $('#btnStopNER').style.display = '';
+  let nLabels = LABELS.size, timer = null, st = {done: 0, total: 0, unique: 0, calls: 0, shared: 0};
+  // 每檔剩餘句數：歸零即存入工作區（其餘檔案於結束時一併存入，含中途停止的部分結果）
+  const left = {};
+  labeledFiles.forEach(f => Object.values(DATA[f]).forEach(m => left[f] = (left[f]||0) + Object.keys(m).length));
+  const segsOf = f => f === fname ? segments : null;
+  // 去重統計：重複率 = 1 - 不重複句數/總句數；省下的呼叫 = 沿用同組結果的句數（不含因重新斷詞而略過的句子）
+  const dedupInfo = () => `${st.total} 句、不重複 ${st.unique} 句（重複率 ${
+    st.total ? (100 * (1 - st.unique / st.total)).toFixed(1) : '0.0'}%），省下 ${st.shared} 次 API 呼叫`;
   try{
-    await runNEROnFiles(DATA, model, token);
-    // 平鋪含 BIO 的 labeled rows（多句多 token）
-    const labeledRows=[];
-    Object.keys(DATA).forEach(file=>{
-      Object.keys(DATA[file]).forEach(sec=>{
-        Object.keys(DATA[file][sec]).forEach(sidx=>{
-          DATA[file][sec][sidx].forEach((t,i)=>{
-            labeledRows.push({
-              id: `${file}:${sec}:${sidx}:${i}`,
-              meta: {file, section:sec, source_span:[null,null], sentence_index:+sidx, token_index:i},
-              text: t.text, start: t.start, end: t.end, label: t.label
-            });
-          });
-        });
-      });
-    });
-    rebuildPage();
-    $('#inStatus').textContent='完成：已套用 NER';
-    enableDownloads({segments, tokenRows, labeled: labeledRows});
+    st = await runNEROnFiles(DATA, model, token, {signal: ctrl.signal, onSentence: (job, stats)=>{
+      finished.add(job.sent); touched.add(job.file);
+      paintSentence(job.file, job.sec, job.sidx, job.sent);
+      if (--left[job.file] === 0) wsSaveFile(job.file, segsOf(job.file));
+      // 出現新實體才更新色票與圖例；摘要至多每 300ms 重組一次
+      if (LABELS.size !== nLabels){ nLabels = LABELS.size; dynBIO(); renderLegend(); bindLegendToggles(); }
+      if (!timer) timer = setTimeout(()=>{ timer = null; rebuildSummary(); }, 300);
+      st = stats;
+      $('#inStatus').textContent = `NER 中：${st.done}/${st.total} 句（畫面上的章節優先；API ${st.calls} 次）`;
+    }});
+    $('#inStatus').textContent = `完成：已套用 NER；${dedupInfo()}`;
   }catch(err){
-    console.error(err);
-    $('#inStatus').textContent='HF API 失敗：' + err.message;
+    if (err.name !== 'AbortError') console.error(err);
+    // 被新的執行取代時不覆寫狀態列
+    if (NER_RUN.ctrl === ctrl) $('#inStatus').textContent = (err.name === 'AbortError'
+      ? `已停止：保留已完成的 ${st.done}/${st.total} 句`
+      : `HF API 失敗：${err.message}（保留已完成的 ${st.done}/${st.total} 句）`) + `，可下載目前結果；${dedupInfo()}`;
+  }finally{
+    clearTimeout(timer);
+    if (NER_RUN.ctrl === ctrl){ NER_RUN.ctrl = null; $('#btnStopNER').style.display = 'none'; }
+    touched.forEach(indexFile);   // 標籤已變更，重建有寫回標籤之檔案的索引
+    labeledFiles.forEach(f => { if (left[f] > 0) wsSaveFile(f, segsOf(f)); });
+    rebuildSummary();
+    runSearch();
   }
 });
+$('#btnStopNER').addEventListener('click', ()=>{
+  // 取消進行中的 NER；已寫回的句子保留
+  if (NER_RUN.ctrl) NER_RUN.ctrl.abort();
+});
+$('#inDict').addEventListener('change', e=>{
+  // 載入使用者詞典（一行一詞，相容 jieba 格式只取第一欄），之後處理的文字生效
+  const file = e.target.files[0]; if (!file) return;
+  const reader = new FileReader();
+  reader.onload = () => {
+    let n = 0;
+    String(reader.result).split(/\\r?\\n/).forEach(line=>{
+      const w = line.trim().split(/\\s+/)[0];
+      if (w && w[0] !== '#' && !SEG_WORDS.has(w)){ SEG_WORDS.add(w); n++; }
+    });
+    buildSegmenter();
+    $('#inStatus').textContent = `已載入使用者詞典：新增 ${n} 詞（共 ${SEG_WORDS.size} 詞）`;
+  };
+  reader.readAsText(file, 'utf-8');
+});
+$('#searchBox').addEventListener('input', runSearch);
+$('#searchResults').addEventListener('scroll', renderSearchWindow);
+$('#searchResults').addEventListener('click', e=>{
+  const row = e.target.closest('.search-row');
+  if (row) jumpToHit(+row.dataset.hit);
+});
+$('#btnClearWS').addEventListener('click', ()=>{
+  // 清空 IndexedDB 工作區；已在記憶體中的檔案保留，尚未載入的檔案自頁面移除
+  if (!WS.db) return;
+  const tx = WS.db.transaction(['meta', 'files'], 'readwrite');
+  tx.objectStore('meta').clear();
+  tx.objectStore('files').clear();
+  tx.oncomplete = () => {
+    WS.meta.forEach((meta, file)=>{ if (!DATA[file]){ applyMetaCounts(meta, -1); SUMMARY_CACHE.delete(file); } });
+    WS.meta.clear();
+    rebuildPage();
+    $('#inStatus').textContent = '已清除工作區';
+  };
+});
 $('#btnClear').addEventListener('click', ()=>{
   // 清空輸入與下載狀態（不動 DATA）
   $('#inText').value = '';
@@ -856,50 +1851,395 @@ $('#btnClear').addEventListener('click', ()=>{
 });
 
 /* ====== 啟動 ====== */
+function readInitPayload(cb){
+  // 讀取內嵌 __INIT__，回呼 cb(init, 解碼毫秒, 錯誤訊息)；失敗時 init 為 {}、錯誤訊息供狀態列顯示
+  // 一般為 JSON 文字；--compress 產生的是 gzip+base64，先以 DecompressionStream 解壓
+  const el = document.getElementById('__INIT__');
+  const raw = (el && el.textContent) || '';
+  const t0 = performance.now();
+  if (!el || el.dataset.encoding !== 'gzip+base64'){
+    let init = {}, msg = '';
+    try{ init = JSON.parse(raw || "{}"); }catch(err){ console.error(err); msg = `無法解析內嵌資料：${err.message}`; }
+    cb(init, performance.now() - t0, msg);
+    return;
+  }
+  if (typeof DecompressionStream === 'undefined'){
+    cb({}, 0, '無法解壓內嵌資料（瀏覽器需支援 DecompressionStream）');
+    return;
+  }
+  // base64 交給 data: URL 由瀏覽器原生解碼，比 atob + 逐字元複製快；
+  // data: URL 有長度上限（例如 Firefox 32 MB），超過時 fetch 失敗，同樣回報錯誤
+  fetch('data:application/octet-stream;base64,' + raw.trim())
+    .then(r => new Response(r.body.pipeThrough(new DecompressionStream('gzip'))).text())
+    .then(txt => cb(JSON.parse(txt), performance.now() - t0, ''))
+    .catch(err => {
+      console.error(err);
+      cb({}, performance.now() - t0, `無法解壓內嵌資料：${err.message}（瀏覽器需支援 DecompressionStream；資料過大時可改用未加 --compress 的報告）`);
+    });
+}
 (function init(){
   // 從內嵌 JSON 初始化（通常是空資料啟動）
-  try{
-    const init = JSON.parse(document.getElementById('__INIT__').textContent || "{}");
-    DATA   = init.files  || {};
-    LABELS = new Set((init.labels||['O']).length ? init.labels : ['O']);
-  }catch(_){
-    DATA = {}; LABELS = new Set(['O']);
-  }
-  rebuildPage();
+  readInitPayload((init, ms, err)=>{
+    try{
+      DATA   = init.files  || {};
+      // Python 內嵌的是 token row 陣列，轉成 Sentence
+      Object.values(DATA).forEach(sections=>Object.values(sections).forEach(sentmap=>{
+        Object.keys(sentmap).forEach(sidx=>{ sentmap[sidx] = sentenceFromRows(sentmap[sidx]); });
+      }));
+      LABELS = new Set((init.labels||['O']).length ? init.labels : ['O']);
+      SEG_WORDS = new Set(init.dict || []);
+    }catch(_){
+      DATA = {}; LABELS = new Set(['O']);
+    }
+    buildSegmenter();
+    const files = DATA; DATA = {};
+    Object.keys(files).forEach(f => setFileData(f, files[f]));
+    rebuildPage();
+    if (err) $('#inStatus').textContent = err;
+    else if (Object.keys(DATA).length) $('#inStatus').textContent = `已載入內嵌資料：${Object.keys(DATA).length} 檔（解碼 ${ms.toFixed(1)} ms）`;
+    // 工作區：只讀 meta（目錄/摘要/統計），檔案展開時才讀 token
+    wsOpen(db=>{
+      if (!db) return;
+      const t0 = performance.now();
+      wsLoadMeta(n=>{
+        if (!n) return;
+        rebuildPage();
+        // 內嵌資料解碼失敗的訊息保留在前面，不被工作區訊息蓋掉
+        $('#inStatus').textContent = (err ? err + '；' : '')
+          + `已開啟工作區：${n} 檔（${(performance.now() - t0).toFixed(1)} ms；展開檔案時才載入 token）`;
+      });
+    });
+  });
 })();
 </script>
 """
 
 HTML_TAIL = "</div></body></html>"
 
+# ===== 壓縮輸出（--compress） =====
+JS_REGEX_PREV = set("(,=:[!&|?{};+-*%<>~^")
+JS_REGEX_KEYWORDS = {"return", "typeof", "case", "do", "else", "in", "of", "void", "delete", "throw", "new"}
+JS_TIGHT = set("{}()[];,:=")  # 這些符號兩側的空白可整個移除
+JS_WORD = re.compile(r"[\w$\u0080-\uffff]+")
+
+def minify_js(src: str) -> str:
+    # 保守的 JS 壓縮：移除註解、縮排、空行與多餘空白
+    # 字串、template literal、正則字面值原樣保留；換行只在前一字元為 ; { , ( [ 或下一字元為 } ) ] 時移除，
+    # 其餘保留，不改變 ASI 行為
+    out: List[str] = []
+    tpl: List[int] = []          # template literal 內 ${ 的大括號深度堆疊
+    i, n = 0, len(src)
+    pending_ws = ""              # 尚未輸出的空白（"" / " " / "\n"）
+
+    def last_sig() -> str:
+        return out[-1][-1] if out else ""
+
+    def last_word() -> str:
+        m = re.search(r"[A-Za-z_$][\w$]*$", out[-1]) if out else None
+        return m.group() if m else ""
+
+    def emit(tok: str):
+        nonlocal pending_ws
+        if pending_ws and out:
+            prev, nxt = last_sig(), tok[0]
+            if pending_ws == "\n" and not (prev in ";{,([" or nxt in "})]"):
+                out.append("\n")
+            elif pending_ws == " " or pending_ws == "\n":
+                if not (prev in JS_TIGHT or nxt in JS_TIGHT):
+                    out.append(" ")
+        pending_ws = ""
+        out.append(tok)
+
+    def scan_template(k: int) -> int:
+        # 自 template literal 內容起點掃到結尾 ` 或 ${，回傳停止位置
+        while k < n:
+            c = src[k]
+            if c == "\\":
+                k += 2
+                continue
+            if c == "`":
+                return k + 1
+            if c == "$" and src[k + 1:k + 2] == "{":
+                return k + 2
+            k += 1
+        return k
+
+    while i < n:
+        c = src[i]
+        if c in " \t\r\n":
+            if c == "\n":
+                pending_ws = "\n"
+            elif not pending_ws:
+                pending_ws = " "
+            i += 1
+        elif c == "/" and src[i + 1:i + 2] == "/":
+            while i < n and src[i] != "\n":
+                i += 1
+        elif c == "/" and src[i + 1:i + 2] == "*":
+            end = src.find("*/", i + 2)
+            i = n if end < 0 else end + 2
+            if not pending_ws:
+                pending_ws = " "
+        elif c in "'\"":
+            k = i + 1
+            while k < n and src[k] != c:
+                k += 2 if src[k] == "\\" else 1
+            emit(src[i:k + 1])
+            i = k + 1
+        elif c == "`":
+            k = scan_template(i + 1)
+            if src[k - 2:k] == "${":
+                tpl.append(0)
+            emit(src[i:k])
+            i = k
+        elif c == "}" and tpl and tpl[-1] == 0:
+            tpl.pop()
+            k = scan_template(i + 1)
+            if src[k - 2:k] == "${":
+                tpl.append(0)
+            emit(src[i:k])
+            i = k
+        elif c == "/" and (not out or last_sig() in JS_REGEX_PREV or last_word() in JS_REGEX_KEYWORDS):
+            k, in_class = i + 1, False
+            while k < n:
+                ch = src[k]
+                if ch == "\\":
+                    k += 2
+                    continue
+                if ch == "[":
+                    in_class = True
+                elif ch == "]":
+                    in_class = False
+                elif ch == "/" and not in_class:
+                    break
+                k += 1
+            k += 1
+            while k < n and (src[k].isalpha()):
+                k += 1
+            emit(src[i:k])
+            i = k
+        else:
+            if tpl and c == "{":
+                tpl[-1] += 1
+            elif tpl and c == "}":
+                tpl[-1] -= 1
+            m = JS_WORD.match(src, i)
+            tok = m.group() if m else c
+            emit(tok)
+            i += len(tok)
+    return "".join(out).strip()
+
+def minify_css(css: str) -> str:
+    # 移除註解與多餘空白；符號兩側的空白一併去掉
+    css = re.sub(r"/\*.*?\*/", "", css, flags=re.S)
+    css = re.sub(r"\s+", " ", css)
+    return re.sub(r"\s*([{};:,>])\s*", r"\1", css).strip()
+
+def minify_html(doc: str) -> str:
+    # <style> / <script> 內容交給對應的壓縮器；其餘只去掉行首縮排（保留換行，不影響排版）
+    parts = re.split(r"(<style[^>]*>.*?</style>|<script>.*?</script>)", doc, flags=re.S)
+    out = []
+    for p in parts:
+        if p.startswith("<style"):
+            head, body = p.split(">", 1)
+            out.append(head + ">" + minify_css(body[:-len("</style>")]) + "</style>")
+        elif p.startswith("<script>"):
+            out.append("<script>" + minify_js(p[len("<script>"):-len("</script>")]) + "</script>")
+        else:
+            out.append(re.sub(r"\n[ \t]+", "\n", p))
+    return "".join(out)
+
+def iter_gzip_base64(chunks: Iterable[str]) -> Iterator[str]:
+    # 串流 gzip 後以 base64 輸出；每次只編碼 3 的倍數位元組，餘數留到下一輪，輸出可直接串接
+    z = zlib.compressobj(9, zlib.DEFLATED, 31)
+    pending = b""
+    for c in chunks:
+        pending += z.compress(c.encode("utf-8"))
+        cut = len(pending) - len(pending) % 3
+        if cut:
+            yield base64.b64encode(pending[:cut]).decode("ascii")
+            pending = pending[cut:]
+    yield base64.b64encode(pending + z.flush()).decode("ascii")
+
+# ===== 效能剖析（--profile） =====
+PROFILE_VERSION = 1
+NO_STAGE = nullcontext()   # 關閉剖析時 stage() 一律回傳此物件，不計時也不配置
+HAS_RESET_PEAK = hasattr(tracemalloc, "reset_peak")   # Python 3.9+；較舊版本無法取得單一 stage 的峰值
+
+class Profiler:
+    # 分階段量測：每個 stage 記錄牆鐘時間、tracemalloc 峰值，以及 stage 內配置、結束時仍存活的前幾名位置；
+    # 整段執行另以 cProfile 取熱點函式。enabled=False 時 stage() 直接回傳 NO_STAGE，不啟動任何追蹤
+    # stage 不可巢狀（tracemalloc 峰值每個 stage 重設）；Python 3.9 以前沒有 reset_peak，stage 的 peak_kb 記為 null
+    def __init__(self, enabled: bool = False, top: int = 15):
+        self.enabled, self.top = enabled, top
+        self.stages: List[dict] = []
+        self._prof: Optional[cProfile.Profile] = None
+        self._t0 = 0.0
+
+    def start(self) -> None:
+        if not self.enabled:
+            return
+        tracemalloc.start()
+        self._prof = cProfile.Profile()
+        self._t0 = time.perf_counter()
+        self._prof.enable()
+
+    def stage(self, name: str):
+        return self._stage(name) if self.enabled else NO_STAGE
+
+    @contextmanager
+    def _stage(self, name: str):
+        before = self._snapshot()
+        if HAS_RESET_PEAK:
+            tracemalloc.reset_peak()
+        base = tracemalloc.get_traced_memory()[0]
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            wall = time.perf_counter() - t0
+            peak = tracemalloc.get_traced_memory()[1]
+            self.stages.append({"name": name, "wall_s": round(wall, 4),
+                                "peak_kb": round((peak - base) / 1024, 1) if HAS_RESET_PEAK else None,
+                                "top_allocations": self._top_allocations(before)})
+
+    @staticmethod
+    def _site(filename: str) -> str:
+        # 本專案檔案只留檔名，其餘（stdlib 等）留最後兩層，報告與安裝路徑無關
+        here = os.path.dirname(os.path.abspath(__file__))
+        if os.path.abspath(filename).startswith(here + os.sep):
+            return os.path.basename(filename)
+        return "/".join(filename.replace("\\", "/").split("/")[-2:])
+
+    @staticmethod
+    def _snapshot() -> tracemalloc.Snapshot:
+        return tracemalloc.take_snapshot().filter_traces((
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, "<frozen importlib._bootstrap*>"),
+            tracemalloc.Filter(False, "<unknown>"),
+        ))
+
+    def _top_allocations(self, before: tracemalloc.Snapshot) -> List[dict]:
+        diff = [st for st in self._snapshot().compare_to(before, "lineno") if st.size_diff > 0]
+        diff.sort(key=lambda st: (-st.size_diff, str(st.traceback)))
+        return [{"site": f"{self._site(st.traceback[0].filename)}:{st.traceback[0].lineno}",
+                 "size_kb": round(st.size_diff / 1024, 1), "count": st.count_diff}
+                for st in diff[:self.top]]
+
+    def report(self) -> dict:
+        # 固定欄位與排序（同分時依函式名），方便跨版本 diff；時間四捨五入到 0.1 ms
+        self._prof.disable()
+        total = time.perf_counter() - self._t0
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        hot = []
+        for (fn, line, name), (_, ncalls, tottime, cumtime, _) in pstats.Stats(self._prof).stats.items():
+            # 內建函式沒有檔名與行號（pstats 記為 "~", 0），只留名稱
+            func = f"{self._site(fn)}:{line}({name})" if line else name
+            hot.append({"function": func, "ncalls": ncalls,
+                        "tottime_s": round(tottime, 4), "cumtime_s": round(cumtime, 4)})
+        hot.sort(key=lambda h: (-h["tottime_s"], h["function"]))
+        return {"version": PROFILE_VERSION,
+                "python": sys.version.split()[0],
+                "argv": sys.argv[1:],
+                "total_wall_s": round(total, 4),
+                "tracemalloc_peak_kb": round(peak / 1024, 1),
+                "stages": self.stages,
+                "hot_functions": hot[:self.top * 2]}
+
+    def write(self, path: str) -> None:
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(self.report(), f, ensure_ascii=False, indent=2)
+            f.write("\n")
+
+def profile_path(out_path: str) -> str:
+    # 剖析報告放在輸出檔旁：report.html -> report.profile.json
+    return os.path.splitext(out_path)[0] + ".profile.json"
+
 # ===== 產出 HTML =====
-def render_html(init_files_map: Dict[str, Dict[str, Dict[int, list]]],
+FilesArg = Union[Dict[str, Dict[str, Dict[int, list]]], Iterable[Tuple[str, Dict[str, Dict[int, list]]]]]
+
+def iter_labeled_files(rows: Iterable[dict]) -> Iterator[Tuple[str, Dict[str, Dict[int, list]]]]:
+    # ner_labeled.jsonl → 逐檔產出 (file, {section: {sidx: [token row]}})
+    # 只保留前端 sentenceFromRows 需要的欄位；同一檔案的列須相鄰（頁面下載的檔案即是如此）
+    seen = set()
+    cur_file, cur = None, None
+    for r in rows:
+        meta = r.get("meta") or {}
+        file = meta.get("file")
+        if file != cur_file:
+            if cur_file is not None:
+                yield cur_file, cur
+            if file in seen:
+                raise ValueError(f"ner_labeled.jsonl 中檔案 {file!r} 的列不相鄰，請先依檔案排序")
+            seen.add(file)
+            cur_file, cur = file, {}
+        sec = cur.setdefault(meta.get("section"), {})
+        sec.setdefault(int(meta.get("sentence_index") or 0), []).append(
+            {"text": r.get("text", ""), "start": r.get("start", 0), "end": r.get("end", 0), "label": r.get("label") or "O"})
+    if cur_file is not None:
+        yield cur_file, cur
+
+def iter_init_json(files: FilesArg, labels: List[str], words: List[str]) -> Iterator[str]:
+    # 逐檔以 iterencode 產出 __INIT__ JSON 片段，記憶體只需容納單一檔案
+    # 每個片段把 < 轉成 \u003c（JSON.parse 後還原），避免資料中的 </script> 或 <!-- 提前結束 <script> 區塊
+    enc = json.JSONEncoder(ensure_ascii=False)
+    def safe(chunks):
+        for c in chunks:
+            yield c.replace("<", "\\u003c")
+    items = files.items() if isinstance(files, dict) else files
+    yield '{"files": {'
+    for n, (file, sections) in enumerate(items):
+        yield from safe([(", " if n else "") + enc.encode(file) + ": "])
+        yield from safe(enc.iterencode(sections))
+    yield "}, "
+    yield from safe(['"labels": ' + enc.encode(labels) + ', "dict": ' + enc.encode(words) + "}"])
+
+def render_html(init_files_map: FilesArg,
                 labels_list: List[str],
                 out_path: str,
                 title: str,
-                subtitle: str) -> None:
-    palette = build_palette(labels_list or ["O"])
-    # 後端先產 BIO 對應 CSS（前端仍會保底覆寫）
-    css_rules = []
-    for lab,(bg,bd) in palette.items():
-        left = "3px" if lab.startswith("B-") else "1px"
-        css_rules.append(f".lab-{cls_safe(lab)}{{background:{bg};border:1px solid {bd};border-left:{left} solid {bd};}}")
-    css_rules = "\\n  ".join(css_rules)
-
-    init_json = json.dumps(
-        {"files": init_files_map or {}, "labels": sorted(set(labels_list or ["O"]))},
-        ensure_ascii=False
-    )
-
-    html_out = []
-    html_out.append(HTML_HEAD.format(title=esc(title), subtitle=esc(subtitle), css_rules=css_rules))
-    html_out.append(HTML_INPUT)
-    html_out.append(HTML_INIT_JSON.format(init_json=init_json))
-    html_out.append(HTML_SCRIPT)
-    html_out.append(HTML_TAIL)
-
-    with open(out_path, "w", encoding="utf-8") as f:
-        f.write("".join(html_out))
+                subtitle: str,
+                user_dict: Optional[List[str]] = None,
+                compress: bool = False,
+                profiler: Optional[Profiler] = None) -> None:
+    # init_files_map 可為 dict，或 (file, sections) 的迭代器（例如 iter_labeled_files），後者以串流寫出
+    # compress=True：模板 CSS/JS 壓縮，__INIT__ 改為 gzip+base64（仍是單一離線檔）
+    prof = profiler or Profiler()
+    with prof.stage("render.template"):
+        palette = build_palette(labels_list or ["O"])
+        # 後端先產 BIO 對應 CSS（前端仍會保底覆寫）
+        css_rules = []
+        for lab,(bg,bd) in palette.items():
+            left = "3px" if lab.startswith("B-") else "1px"
+            css_rules.append(f".lab-{cls_safe(lab)}{{background:{bg};border:1px solid {bd};border-left:{left} solid {bd};}}")
+        css_rules = "\\n  ".join(css_rules)
+
+        head = HTML_HEAD.format(title=esc(title), subtitle=esc(subtitle), css_rules=css_rules) + HTML_INPUT
+        script = HTML_SCRIPT + HTML_TAIL
+        init_head, init_tail = (HTML_INIT_GZIP if compress else HTML_INIT_JSON).split("{init_json}")
+        if compress:
+            head, script = minify_html(head), minify_html(script)
+    # 串流寫出：讀取輸入（iter_labeled_files）、序列化與壓縮都在這個 stage 內交錯進行
+    with prof.stage("render.write"):
+        chunks = iter_init_json(init_files_map or {}, sorted(set(labels_list or ["O"])),
+                                sorted(set(MED_DICT + (user_dict or []))))
+        # 先寫到同目錄的暫存檔，完整寫完才取代 out_path；
+        # 輸入迭代器中途出錯（例如 iter_labeled_files 的 ValueError）時不留下截斷的報告、也不覆蓋舊檔
+        tmp_path = out_path + ".tmp"
+        try:
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                f.write(head)
+                f.write(init_head)
+                for chunk in (iter_gzip_base64(chunks) if compress else chunks):
+                    f.write(chunk)
+                f.write(init_tail)
+                f.write(script)
+            os.replace(tmp_path, out_path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
 
 # ===== CLI =====
 def build_argparser():
@@ -907,12 +2247,41 @@ def build_argparser():
     ap.add_argument("--out", default="ner_report.html", help="輸出 HTML 檔名")
     ap.add_argument("--title", default="臨床 NER 標註報告", help="頁面標題")
     ap.add_argument("--subtitle", default="貼上病歷文字 → 斷段/分詞 → 可套用 Hugging Face NER → 下載三種 JSONL", help="副標")
+    ap.add_argument("--user-dict", metavar="TXT", help="使用者詞典（一行一詞），與內建詞典一起嵌入頁面供中文斷詞使用")
+    ap.add_argument("--labeled", metavar="JSONL", help="以 ner_labeled.jsonl 預先載入標註結果（逐檔串流寫入頁面）")
+    ap.add_argument("--compress", action="store_true", help="壓縮內嵌 CSS/JS，__INIT__ 以 gzip+base64 內嵌（需支援 DecompressionStream 的瀏覽器）")
+    ap.add_argument("--stats", metavar="JSONL", help="串流統計 ner_labeled.jsonl 的實體數（每類型/章節/檔案）後結束，不產生 HTML")
+    ap.add_argument("--profile", action="store_true",
+                    help="剖析各階段耗時、cProfile 熱點與 tracemalloc 記憶體，報告寫到 <out>.profile.json")
     return ap
 
 def main():
     args = build_argparser().parse_args()
-    # 空資料啟動；使用者貼文字後產生內容
-    render_html(init_files_map={}, labels_list=["O"], out_path=args.out, title=args.title, subtitle=args.subtitle)
+    prof = Profiler(enabled=args.profile)
+    prof.start()
+    run(args, prof)
+    if args.profile:
+        prof.write(profile_path(args.out))
+        print(f"[OK] wrote {profile_path(args.out)}")
+
+def run(args, prof: Profiler):
+    if args.stats:
+        with prof.stage("stats"):
+            summary = summarize_labeled(iter_jsonl(args.stats))
+        print(json.dumps(summary, ensure_ascii=False, indent=2))
+        return
+    with prof.stage("load_user_dict"):
+        user_dict = load_user_dict(args.user_dict) if args.user_dict else None
+    if args.labeled:
+        # 兩次串流讀取：先收集標籤集合（CSS 需要先寫），再逐檔寫入 __INIT__
+        with prof.stage("collect_labels"):
+            labels = sorted({str(r.get("label") or "O") for r in iter_jsonl(args.labeled)} | {"O"})
+        files = iter_labeled_files(iter_jsonl(args.labeled))
+    else:
+        # 空資料啟動；使用者貼文字後產生內容
+        labels, files = ["O"], {}
+    render_html(init_files_map=files, labels_list=labels, out_path=args.out, title=args.title, subtitle=args.subtitle,
+                user_dict=user_dict, compress=args.compress, profiler=prof)
     print(f"[OK] wrote {args.out}")
 
 if __name__ == "__main__":